@@ -1,40 +1,250 @@
-import google.generativeai as genai
-import streamlit as st
 import os
 import ast
-from .prompts import SYSTEM_PROMPT # The '.' means import from the same folder
+import contextlib
+import json
+import random
+import threading
+import time
+from google.api_core import exceptions as api_exceptions
+from .prompts import SYSTEM_PROMPT, OUT_OF_CORE_SYSTEM_PROMPT # The '.' means import from the same folder
+from . import query_index, response_cache
+from monitoring.tracing import stage
 
 
-@st.cache_data
-def generate_pandas_code(df , query):
-    """Sends the query and schema to the AI model and returns the generated code."""
-    st.info("🧠 Agent is thinking...")
-    model = genai.GenerativeModel(
-            'gemini-flash-latest',  
-            system_instruction=SYSTEM_PROMPT
-        )
+MODEL_NAME = 'gemini-flash-latest'
+MAX_TITLE_LENGTH = 80
+# Model requests in flight at once across every session of this server,
+# per-request timeout and retries (with exponential backoff) on transient errors.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("INSIGHT_MAX_MODEL_REQUESTS", 8))
+REQUEST_TIMEOUT = float(os.getenv("INSIGHT_MODEL_TIMEOUT", 60))
+MAX_RETRIES = int(os.getenv("INSIGHT_MODEL_RETRIES", 3))
+BACKOFF_SECONDS = 1.0
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    TimeoutError,
+    ConnectionError,
+)
+
+# google.generativeai takes about a second to import, so it is only loaded
+# (and configured with the key given to configure_model) on first use.
+_api_key = None
+_genai = None
+_genai_lock = threading.Lock()
+
+# Bound on concurrent model requests. Process-wide by default; batch workers
+# install a multiprocessing semaphore shared by all of them. None means unbounded.
+_request_limiter = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+def configure_model(api_key):
+    """Sets the API key used by every model request."""
+    global _api_key
+    _api_key = api_key
+    if _genai is not None:
+        _genai.configure(api_key=api_key)
+
+
+def get_genai():
+    """Returns the google.generativeai module, importing and configuring it once."""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            if _api_key:
+                genai.configure(api_key=_api_key)
+            _genai = genai
+        return _genai
+
+
+def warm_up_client():
+    """Creates the shared Gemini client, so the first request does not pay for it."""
+    get_genai()
+    from google.generativeai import client
+    client.get_default_generative_client()
+
+
+def set_request_limiter(limiter):
+    """Installs a semaphore-like object that every model request must hold."""
+    global _request_limiter
+    _request_limiter = limiter
+
+
+def _with_retries(call):
+    """Runs call(), retrying transient API errors with jittered exponential backoff."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return call()
+        except RETRYABLE_ERRORS:
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random()))
+
+
+def _request(model, prompt):
+    """One blocking model request, holding a limiter slot only while it runs."""
+    with _request_limiter or contextlib.nullcontext():
+        return model.generate_content(prompt, request_options={"timeout": REQUEST_TIMEOUT})
+
+
+def _generate_text(task, prompt, system_instruction=None, cache_key=None, parse=None, generation_config=None):
+    """
+    Calls the model through the persistent response cache.
+    The key is the model name, the system prompt and `cache_key` (defaults to the
+    full prompt). When `parse` is given the raw text is only cached if it parses,
+    so a malformed answer is retried next time instead of being replayed.
+    `task` names the call in the latency traces (e.g. 'code', 'title').
+    """
+    key = response_cache.make_key(
+        MODEL_NAME, system_instruction, prompt if cache_key is None else cache_key
+    )
+    with stage(f"llm.{task}", prompt_chars=len(prompt)) as span:
+        text = response_cache.get(key)
+        span["cache"] = "miss" if text is None else "hit"
+        if text is None:
+            model = get_genai().GenerativeModel(
+                MODEL_NAME,
+                system_instruction=system_instruction,
+                generation_config=generation_config
+            )
+            text = _with_retries(lambda: _request(model, prompt)).text
+        span["response_chars"] = len(text)
+
+    result = parse(text) if parse else text
+    if span["cache"] == "miss":
+        response_cache.put(key, text)
+    return result
+
+
+def _stream_text(task, prompt, system_instruction=None, cache_key=None, parse=None):
+    """
+    Streaming twin of _generate_text: yields the answer in chunks as the model
+    produces them. A cached answer is yielded as a single chunk; a completed
+    stream is cached under the same key as the blocking call, so either one
+    replays the other. If `parse` rejects the full text it is simply not cached.
+    """
+    key = response_cache.make_key(
+        MODEL_NAME, system_instruction, prompt if cache_key is None else cache_key
+    )
+    with stage(f"llm.{task}", prompt_chars=len(prompt), stream=True) as span:
+        text = response_cache.get(key)
+        span["cache"] = "miss" if text is None else "hit"
+        if text is not None:
+            span["response_chars"] = len(text)
+            yield text
+            return
+
+        started = time.perf_counter()
+        model = get_genai().GenerativeModel(MODEL_NAME, system_instruction=system_instruction)
+        parts = []
+
+        def open_stream():
+            # Like _request, a slot is taken per attempt, so backoff sleeps
+            # between retries do not hold one.
+            slot = contextlib.ExitStack()
+            slot.enter_context(_request_limiter or contextlib.nullcontext())
+            try:
+                return slot, model.generate_content(
+                    prompt, stream=True, request_options={"timeout": REQUEST_TIMEOUT})
+            except BaseException:
+                slot.close()
+                raise
+
+        slot, response = _with_retries(open_stream)
+        # The slot is held until the stream is fully consumed.
+        with slot:
+            for chunk in response:
+                if not chunk.text:
+                    continue
+                if not parts:
+                    span["first_chunk_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                parts.append(chunk.text)
+                yield chunk.text
+        text = "".join(parts)
+        span["response_chars"] = len(text)
+
+    try:
+        if parse:
+            parse(text)
+    except Exception:
+        return
+    response_cache.put(key, text)
+
+
+def _iter_list_items(chunks):
+    """
+    Yields each string of a streamed Python/JSON list (e.g. "['a', 'b']") as
+    soon as its closing quote arrives, without waiting for the whole list.
+    """
+    quote, escaped, current = None, False, []
+    for chunk in chunks:
+        for char in chunk:
+            if quote is None:
+                if char in "'\"":
+                    quote, current = char, [char]
+                continue
+            current.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+                try:
+                    yield ast.literal_eval("".join(current))
+                except (ValueError, SyntaxError):
+                    pass
+
+
+def _clean_code(text):
+    return text.strip().strip("```python").strip("```")
+
+
+def generate_pandas_code(df , query, out_of_core=False):
+    """
+    Sends the query and schema to the AI model and returns the generated code.
+    With `out_of_core` the code targets the on-disk pyarrow dataset `ds` and
+    `df` is only its preview, used for the schema.
+    """
     columns = df.columns.tolist()
     prompt_part = [
         f"query: \"{query}\"",
         f"Columns: {columns}",
         "Code:"
     ]
+    if out_of_core:
+        prompt_part.insert(2, f"Column types: {df.dtypes.astype(str).to_dict()}")
     full_prompt = "\n".join(prompt_part)
+    fingerprint = response_cache.schema_fingerprint(df)
+    scope = f"{fingerprint}:{'out_of_core' if out_of_core else 'df'}"
     try:
-        response = model.generate_content(full_prompt)
-        code = response.text.strip().strip("```python").strip("```")
+        # A near-duplicate of a query already answered on this schema reuses its code.
+        with stage("llm.code.similar") as span:
+            match = query_index.lookup(scope, query)
+            span["cache"] = "hit" if match else "miss"
+            if match:
+                span["score"] = round(match[2], 3)
+                return match[0]
+
+        # Keyed on the schema fingerprint, never on the frame's contents.
+        code = _generate_text(
+            "code",
+            full_prompt,
+            system_instruction=OUT_OF_CORE_SYSTEM_PROMPT if out_of_core else SYSTEM_PROMPT,
+            cache_key=(fingerprint, query),
+            parse=_clean_code,
+        )
+        query_index.add(scope, query, code)
         return code
     except Exception as e:
         return f"Error generating code: {e}"
     return None
 
-@st.cache_data
 def get_professionnal_title(query):
     """uses ia to turn a user query into a professionnal report title"""
-    model = genai.GenerativeModel(
-        'gemini-flash-latest',
-
-    )
     prompt = f"""
     You are a professional report editor.
     A user asked the following query: "{query}"
@@ -57,24 +267,71 @@ def get_professionnal_title(query):
     Title:
     """
     try:
-        response = model.generate_content(prompt)
-        title = response.text.strip().strip('"')
+        title = _generate_text("title", prompt).strip().strip('"')
         return title
     except Exception as e:
         return f"Error generating title: {e}"
-    
-    
-@st.cache_data
-def generate_overview_analysis(data_context):
+
+
+def _parse_title_list(text):
+    titles = json.loads(text)
+    if not isinstance(titles, list):
+        raise ValueError("Expected a JSON list of titles.")
+    return titles
+
+
+def _is_valid_title(title):
+    return isinstance(title, str) and 0 < len(title.strip().strip('"')) <= MAX_TITLE_LENGTH
+
+
+def get_professionnal_titles(queries):
     """
-    Agent 1: Generates the simple, 2-3 sentence overview summary.
+    Turns every report query into a section title with a single model call.
+    Entries missing from the answer or failing validation fall back to
+    get_professionnal_title, so the result always matches `queries` one to one.
     """
-    model = genai.GenerativeModel(
-        'gemini-flash-latest',
-        system_instruction="You are a data analyst writing a brief dataset summary."
-    )
+    if not queries:
+        return []
+    numbered = "\n".join(f"{i + 1}. {query}" for i, query in enumerate(queries))
+    prompt = f"""
+    You are a professional report editor.
+    Users asked the following numbered queries:
+    {numbered}
+
+    For EACH query, generate a short, human-readable section heading for a business report.
+    Do not include "Analysis of" or "Chart of". Just the title.
+
+    CRITICAL RULES:
+    - Return ONLY a JSON list of {len(queries)} strings, in the same order as the queries.
+    - Example: ["Product Profitability", "Average Sales by Region", "Data Sample"]
+    """
+    try:
+        titles = _generate_text(
+            "titles",
+            prompt,
+            parse=_parse_title_list,
+            generation_config={"response_mime_type": "application/json"}
+        )
+    except Exception:
+        titles = []
+
+    results = []
+    for i, query in enumerate(queries):
+        title = titles[i] if i < len(titles) else None
+        if _is_valid_title(title):
+            results.append(title.strip().strip('"'))
+        else:
+            results.append(get_professionnal_title(query))
+    return results
+    
     
-    full_prompt = f"""
+OVERVIEW_INSTRUCTION = "You are a data analyst writing a brief dataset summary."
+ANALYSIS_INSTRUCTION = "You are a professional data analyst writing a key insight for a business report."
+RECOMMENDATIONS_INSTRUCTION = "You are a helpful assistant suggesting new data analysis queries."
+
+
+def _overview_prompt(data_context):
+    return f"""
     Here is the head of a dataset:
     ---
     {data_context}
@@ -86,23 +343,10 @@ def generate_overview_analysis(data_context):
     - DO NOT suggest any "Future Prompts" or "Recommendations".
     - Just write the plain text summary paragraph.
     """
-    try:
-        response = model.generate_content(full_prompt)
-        return response.text
-    except Exception as e:
-        return f"Error analyzing data: {e}"
 
-@st.cache_data
-def generate_markdown_analysis(prompt_question, data_context):
-    """
-    Agent 2: Generates the detailed, structured analysis for a report item.
-    """
-    model = genai.GenerativeModel(
-        'gemini-flash-latest', # 
-        system_instruction="You are a professional data analyst writing a key insight for a business report."
-    )
-    
-    full_prompt = f"""
+
+def _analysis_prompt(prompt_question, data_context):
+    return f"""
     A user asked: "{prompt_question}"
     Here is the data/chart result:
     ---
@@ -124,25 +368,10 @@ def generate_markdown_analysis(prompt_question, data_context):
     ### Business Impact
     (Write 1-2 bullet points.)
     """
-    try:
-        response = model.generate_content(full_prompt)
-        return response.text
-    except Exception as e:
-        return f"Error analyzing data: {e}"
-    
-    import ast # Add 'import ast' to the top of analysis_agent.py
 
-@st.cache_data
-def generate_recommendations(data_context):
-    """
-    Agent 3: Generates a list of 3 suggested follow-up queries.
-    """
-    model = genai.GenerativeModel(
-        'gemini-flash-latest',
-        system_instruction="You are a helpful assistant suggesting new data analysis queries."
-    )
-    
-    full_prompt = f"""
+
+def _recommendations_prompt(data_context):
+    return f"""
     Here is the head of a dataset:
     ---
     {data_context}
@@ -153,9 +382,68 @@ def generate_recommendations(data_context):
     - Return ONLY a Python list of strings.
     - Example: ['What is the total sales?', 'Plot sales by region']
     """
+
+
+def generate_overview_analysis(data_context):
+    """
+    Agent 1: Generates the simple, 2-3 sentence overview summary.
+    """
+    try:
+        return _generate_text("overview", _overview_prompt(data_context), system_instruction=OVERVIEW_INSTRUCTION)
+    except Exception as e:
+        return f"Error analyzing data: {e}"
+
+
+def generate_markdown_analysis(prompt_question, data_context):
+    """
+    Agent 2: Generates the detailed, structured analysis for a report item.
+    """
+    try:
+        return _generate_text(
+            "analysis", _analysis_prompt(prompt_question, data_context), system_instruction=ANALYSIS_INSTRUCTION
+        )
+    except Exception as e:
+        return f"Error analyzing data: {e}"
+
+
+def generate_recommendations(data_context):
+    """
+    Agent 3: Generates a list of 3 suggested follow-up queries.
+    """
     try:
-        response = model.generate_content(full_prompt)
         # Safely convert the AI's string output into a real Python list
-        return ast.literal_eval(response.text)
+        return _generate_text(
+            "recommendations", _recommendations_prompt(data_context),
+            system_instruction=RECOMMENDATIONS_INSTRUCTION, parse=ast.literal_eval
+        )
+    except Exception as e:
+        return [f"Error generating recommendations: {e}"]
+
+
+def stream_overview_analysis(data_context):
+    """Streaming version of generate_overview_analysis: yields text chunks."""
+    try:
+        yield from _stream_text("overview", _overview_prompt(data_context), system_instruction=OVERVIEW_INSTRUCTION)
+    except Exception as e:
+        yield f"Error analyzing data: {e}"
+
+
+def stream_markdown_analysis(prompt_question, data_context):
+    """Streaming version of generate_markdown_analysis: yields markdown chunks."""
+    try:
+        yield from _stream_text(
+            "analysis", _analysis_prompt(prompt_question, data_context), system_instruction=ANALYSIS_INSTRUCTION
+        )
+    except Exception as e:
+        yield f"Error analyzing data: {e}"
+
+
+def stream_recommendations(data_context):
+    """Streaming version of generate_recommendations: yields each query once complete."""
+    try:
+        yield from _iter_list_items(_stream_text(
+            "recommendations", _recommendations_prompt(data_context),
+            system_instruction=RECOMMENDATIONS_INSTRUCTION, parse=ast.literal_eval
+        ))
     except Exception as e:
-        return [f"Error generating recommendations: {e}"]
\ No newline at end of file
+        yield f"Error generating recommendations: {e}"
\ No newline at end of file
@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+# Size limit for the result context sent with an analysis prompt. Tokens are
+# estimated at ~4 characters each, which is close enough for budgeting.
+TOKEN_BUDGET = int(os.getenv("INSIGHT_CONTEXT_TOKENS", 1500))
+CHARS_PER_TOKEN = 4
+# Progressively smaller digests tried until one fits in the budget:
+# (rows shown, max columns, include describe stats, points per trace series).
+DETAIL_LEVELS = [(20, 40, True, 30), (10, 25, True, 15), (5, 15, False, 8), (0, 10, False, 4)]
+MAX_TRACES = 12
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _fmt(value):
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def _frame_digest(df, rows, max_cols, with_stats):
+    lines = [f"Shape: {df.shape[0]} rows x {df.shape[1]} columns"]
+    shown = df.iloc[:, :max_cols]
+    hidden = df.shape[1] - shown.shape[1]
+
+    lines.append("Columns (dtype):")
+    lines.append(", ".join(f"{col} ({dtype})" for col, dtype in shown.dtypes.items()))
+    if hidden:
+        lines.append(f"... and {hidden} more columns")
+
+    with pd.option_context("display.width", 200, "display.max_columns", max_cols,
+                           "display.float_format", "{:.4g}".format):
+        if with_stats:
+            numeric = shown.select_dtypes("number")
+            if not numeric.empty:
+                lines.append("Numeric summary:")
+                lines.append(numeric.describe().T[["mean", "std", "min", "50%", "max"]].to_string())
+        if rows:
+            lines.append(f"Top {min(rows, len(df))} rows:")
+            lines.append(shown.head(rows).to_string())
+    return "\n".join(lines)
+
+
+def _series_summary(values, points):
+    """Describes one axis of a trace: range for numbers, top values otherwise."""
+    if values is None or np.ndim(values) == 0 or len(values) == 0:
+        return None
+    series = pd.Series(np.asarray(values))
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return f"range {_fmt(series.min())} to {_fmt(series.max())}"
+    top = series.astype(str).value_counts().head(points)
+    return f"{series.nunique()} distinct values, most frequent: " + ", ".join(top.index)
+
+
+def _aggregated_pairs(x, y, points):
+    """Pairs (x, y) for short traces, bucket means of y for long ones."""
+    y_values = pd.to_numeric(pd.Series(np.asarray(y)), errors="coerce")
+    x_values = pd.Series(np.asarray(x)) if x is not None else pd.Series(range(len(y_values)))
+    if len(y_values) <= points:
+        return ", ".join(f"({_fmt(a)}, {_fmt(b)})" for a, b in zip(x_values, y_values))
+    buckets = np.array_split(np.arange(len(y_values)), points)
+    return ", ".join(
+        f"[{_fmt(x_values.iloc[idx[0]])}..{_fmt(x_values.iloc[idx[-1]])}] mean {_fmt(y_values.iloc[idx].mean())}"
+        for idx in buckets if len(idx)
+    )
+
+
+def _figure_digest(fig, points):
+    layout = fig.layout
+    lines = []
+    if layout.title and layout.title.text:
+        lines.append(f"Chart title: {layout.title.text}")
+    x_title = layout.xaxis.title.text if layout.xaxis and layout.xaxis.title else None
+    y_title = layout.yaxis.title.text if layout.yaxis and layout.yaxis.title else None
+    lines.append(f"Axes: x = {x_title or 'unnamed'}, y = {y_title or 'unnamed'}")
+    lines.append(f"Traces: {len(fig.data)}")
+
+    for trace in fig.data[:MAX_TRACES]:
+        x, y = getattr(trace, "x", None), getattr(trace, "y", None)
+        n = max(len(v) if v is not None and np.ndim(v) else 0
+                for v in (x, y, getattr(trace, "values", None)))
+        lines.append(f"- {trace.type} '{trace.name or ''}' with {n} points")
+        for axis, values in (("x", x), ("y", y)):
+            summary = _series_summary(values, points)
+            if summary:
+                lines.append(f"  {axis}: {summary}")
+        if trace.type == "box" and getattr(trace, "median", None) is not None:
+            lines.append(f"  medians: {', '.join(_fmt(v) for v in trace.median)}")
+        elif trace.type == "pie" and trace.values is not None:
+            lines.append("  slices: " + _aggregated_pairs(trace.labels, trace.values, points))
+        elif y is not None and np.ndim(y) and len(y) and trace.type != "histogram":
+            lines.append("  series: " + _aggregated_pairs(x, y, points))
+    if len(fig.data) > MAX_TRACES:
+        lines.append(f"... and {len(fig.data) - MAX_TRACES} more traces")
+    return "\n".join(lines)
+
+
+def build_overview_context(df):
+    """Head and dtypes of a dataset, the context of the overview prompts."""
+    return f"Data Head:\n{df.head().to_string()}\n\nData Types:\n{df.dtypes.to_string()}"
+
+
+def build_result_context(result, token_budget=TOKEN_BUDGET):
+    """
+    Turns any result into a compact, deterministic text digest for the analysis
+    prompt. Small results are shown in full; larger ones are summarized at the
+    most detailed level that fits in `token_budget`.
+    """
+    max_chars = token_budget * CHARS_PER_TOKEN
+
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        df = result.to_frame() if isinstance(result, pd.Series) else result
+        if df.size <= 2000:
+            full = df.to_string()
+            if len(full) <= max_chars:
+                return full
+        digests = (_frame_digest(df, rows, cols, stats) for rows, cols, stats, _ in DETAIL_LEVELS)
+    elif isinstance(result, go.Figure):
+        digests = (_figure_digest(result, points) for *_, points in DETAIL_LEVELS)
+    else:
+        digests = iter([str(result)])
+
+    digest = ""
+    for digest in digests:
+        if len(digest) <= max_chars:
+            return digest
+    return digest[:max_chars - 15] + "\n... (truncated)"
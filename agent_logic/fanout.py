@@ -0,0 +1,67 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from monitoring.tracing import bind_context
+
+
+# Threads that run independent agent calls side by side. Model requests are
+# still bounded by the limiter in analysis_agent; this only sets how many
+# calls may be waiting on it at once.
+AGENT_THREADS = int(os.getenv("INSIGHT_AGENT_THREADS", 16))
+# Longest wait for the next result or chunk of a background call.
+FANOUT_TIMEOUT = float(os.getenv("INSIGHT_FANOUT_TIMEOUT", 300))
+
+_pool = None
+_pool_lock = threading.Lock()
+_DONE = object()
+
+
+def get_agent_pool():
+    """Returns the process-wide thread pool for agent calls, shared by all sessions."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=AGENT_THREADS, thread_name_prefix="agent")
+        return _pool
+
+
+def submit(fn, *args, **kwargs):
+    """Starts fn(*args, **kwargs) in the background, in the caller's trace."""
+    return get_agent_pool().submit(bind_context(fn), *args, **kwargs)
+
+
+def stream_in_background(gen_fn, *args, **kwargs):
+    """
+    Starts consuming the generator gen_fn(*args, **kwargs) now, and returns an
+    iterator over its items as they arrive. Several streams started this way
+    run concurrently; each can then be rendered in turn without waiting for
+    the one before it to be requested.
+    """
+    items = queue.Queue()
+
+    def pump():
+        try:
+            for item in gen_fn(*args, **kwargs):
+                items.put((item, None))
+        except BaseException as e:
+            items.put((_DONE, e))
+            return
+        items.put((_DONE, None))
+
+    submit(pump)
+
+    def iterate():
+        while True:
+            try:
+                item, error = items.get(timeout=FANOUT_TIMEOUT)
+            except queue.Empty:
+                raise TimeoutError(f"No response from the model after {FANOUT_TIMEOUT:.0f}s.")
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+
+    return iterate()
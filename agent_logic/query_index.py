@@ -0,0 +1,147 @@
+import ast
+import contextlib
+import math
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+
+from data_engine.storage import cache_dir
+from . import response_cache
+
+
+# Local index of answered queries per schema, used to reuse generated code for
+# near-duplicate questions ("avg sales by region" vs "What is the average sales
+# per region?"). Lexical only: candidates must use the same words in the same
+# order once filler words and synonyms are normalized away, and are ranked by
+# character trigrams.
+ENABLED = response_cache.ENABLED and os.getenv("INSIGHT_QUERY_INDEX", "1") != "0"
+SIMILARITY_THRESHOLD = float(os.getenv("INSIGHT_QUERY_SIMILARITY", 0.85))
+MAX_ENTRIES_PER_SCHEMA = 500
+DB_PATH = os.path.join(cache_dir("llm"), "query_index.sqlite")
+
+STOPWORDS = {
+    "an", "the", "what", "whats", "is", "are", "was", "were", "me", "show", "give", "tell",
+    "please", "can", "you", "want", "to", "see", "display", "list", "find", "get", "of",
+    "in", "for", "data", "dataset", "df", "do", "does", "which", "how", "there", "value", "values",
+}
+SYNONYMS = {
+    "avg": "average", "mean": "average", "per": "by", "each": "by", "across": "by",
+    "total": "sum", "number": "count", "num": "count", "nb": "count", "qty": "quantity",
+    "max": "maximum", "highest": "maximum", "largest": "maximum", "biggest": "maximum",
+    "min": "minimum", "lowest": "minimum", "smallest": "minimum",
+    "graph": "chart", "plot": "chart", "visualize": "chart", "visualise": "chart",
+    "distribution": "histogram", "boxplot": "box", "==": "=",
+}
+# Quoted values ('EU', "Product A") must match verbatim, case included.
+QUOTED = re.compile(r"(?<!\w)'([^']+)'(?!\w)|\"([^\"]+)\"")
+
+
+@contextlib.contextmanager
+def _connect():
+    """Yields a connection inside a transaction and always closes it."""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            " scope TEXT NOT NULL, normalized TEXT NOT NULL, query TEXT NOT NULL,"
+            " code TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (scope, normalized))"
+        )
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def normalize(query):
+    """Lower-cased words with synonyms mapped and filler words dropped."""
+    # Apostrophes inside words are dropped ("what's" -> "whats"); single
+    # letters are kept, they are often filter values ("product A").
+    text = re.sub(r"(?<=\w)'(?=\w)", "", query.lower()).replace("_", " ")
+    # Comparison and arithmetic operators (and number signs) are kept as
+    # words: "sales > 100" and "sales < 100" must not match.
+    words = re.findall(r"[a-z0-9]+(?:\.[0-9]+)?|[<>!=]=?|[-+*/%]", text)
+    words = [SYNONYMS.get(word, word) for word in words]
+    return " ".join(word for word in words if word not in STOPWORDS)
+
+
+def _trigrams(text):
+    padded = f" {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a, b):
+    """Cosine similarity of the character trigrams of two normalized queries."""
+    if a == b:
+        return 1.0
+    va, vb = _trigrams(a), _trigrams(b)
+    dot = sum(count * vb[gram] for gram, count in va.items())
+    norm = math.sqrt(sum(c * c for c in va.values())) * math.sqrt(sum(c * c for c in vb.values()))
+    return dot / norm if norm else 0.0
+
+
+def _signature(query):
+    """What must be identical between two matching queries: the sequence of
+    words left after normalization, so only filler words and synonyms may
+    differ ("profit against sales" is not "sales against profit"), and the
+    quoted values."""
+    quoted = [single or double for single, double in QUOTED.findall(query)]
+    return normalize(query).split(), quoted
+
+
+def is_valid_code(code):
+    """True if the code parses and assigns `result`."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    return any(
+        isinstance(node, ast.Name) and node.id == "result" and isinstance(node.ctx, ast.Store)
+        for node in ast.walk(tree)
+    )
+
+
+def lookup(scope, query, threshold=SIMILARITY_THRESHOLD):
+    """
+    Returns (code, matched_query, score) for the most similar query answered
+    in `scope` (schema fingerprint plus prompt mode), or None below threshold.
+    """
+    if not ENABLED:
+        return None
+    normalized = normalize(query)
+    signature = _signature(query)
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT normalized, query, code FROM queries WHERE scope = ?", (scope,)
+        ).fetchall()
+
+    best = None
+    for candidate, original, code in rows:
+        score = similarity(normalized, candidate)
+        if score < threshold or (best and score <= best[2]):
+            continue
+        if _signature(original) != signature or not is_valid_code(code):
+            continue
+        best = (code, original, score)
+    return best
+
+
+def add(scope, query, code):
+    """Records generated code for a query; keeps the newest entries per scope."""
+    if not ENABLED or not is_valid_code(code):
+        return
+    normalized = normalize(query)
+    if not normalized:
+        return
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)",
+            (scope, normalized, query, code, time.time()),
+        )
+        conn.execute(
+            "DELETE FROM queries WHERE scope = ? AND normalized NOT IN ("
+            " SELECT normalized FROM queries WHERE scope = ? ORDER BY created_at DESC LIMIT ?)",
+            (scope, scope, MAX_ENTRIES_PER_SCHEMA),
+        )
@@ -0,0 +1,98 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from data_engine.storage import cache_dir
+
+
+# Disk-backed cache for model responses. SQLite gives us a single file that
+# survives restarts and can be shared safely by every worker process.
+ENABLED = os.getenv("INSIGHT_LLM_CACHE", "1") != "0"
+DEFAULT_TTL = int(os.getenv("INSIGHT_LLM_CACHE_TTL", 7 * 24 * 3600))
+MAX_CACHE_BYTES = int(os.getenv("INSIGHT_LLM_CACHE_BYTES", 256 * 1024**2))
+DB_PATH = os.path.join(cache_dir("llm"), "responses.sqlite")
+
+
+@contextlib.contextmanager
+def _connect():
+    """Yields a connection inside a transaction and always closes it."""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        _init(conn)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _init(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+        " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+    )
+
+
+def make_key(*parts):
+    """Builds a cache key from any JSON-serializable parts (model, prompt, ...)."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def schema_fingerprint(df):
+    """Compact hash of the column names and dtypes, cheap even on huge frames."""
+    schema = [(str(col), str(dtype)) for col, dtype in df.dtypes.items()]
+    return make_key(schema)[:16]
+
+
+def get(key):
+    """Returns the cached value for `key`, or None if missing or expired."""
+    if not ENABLED:
+        return None
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+    return json.loads(row[0])
+
+
+def put(key, value, ttl=None):
+    """Stores a JSON-serializable value, then evicts old entries if over budget."""
+    if not ENABLED:
+        return
+    now = time.time()
+    payload = json.dumps(value)
+    ttl = DEFAULT_TTL if ttl is None else ttl
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, payload, len(payload), now + ttl, now),
+        )
+        _evict(conn, now)
+
+
+def _evict(conn, now):
+    """Drops expired rows, then least recently used rows until under budget."""
+    conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= MAX_CACHE_BYTES:
+        return
+    rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+    stale = []
+    for key, size in rows:
+        if total <= MAX_CACHE_BYTES:
+            break
+        stale.append((key,))
+        total -= size
+    conn.executemany("DELETE FROM responses WHERE key = ?", stale)
@@ -0,0 +1,158 @@
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from data_engine.result_cache import execute_cached, get_result_cache, result_key
+from monitoring.tracing import end_trace, start_trace
+from .analysis_agent import generate_markdown_analysis, generate_pandas_code
+from .context_builder import build_result_context, estimate_tokens
+
+
+# Speculative answers for recommended queries are opt-in. They run on their
+# own small pool so they never hold up foreground work, and their model usage
+# is capped by a process-wide hourly token budget.
+ENABLED_BY_DEFAULT = os.getenv("INSIGHT_SPECULATE", "0") == "1"
+SPECULATION_WORKERS = int(os.getenv("INSIGHT_SPECULATION_WORKERS", 1))
+TOKENS_PER_HOUR = int(os.getenv("INSIGHT_SPECULATION_TOKENS_PER_HOUR", 200_000))
+# Rough size of the code prompt's fixed part (the system prompt), in tokens.
+CODE_PROMPT_TOKENS = 600
+
+
+class TokenBudget:
+    """Sliding one-hour window of estimated tokens spent, shared by all sessions."""
+
+    def __init__(self, tokens_per_hour=TOKENS_PER_HOUR):
+        self.tokens_per_hour = tokens_per_hour
+        self._spent = collections.deque()
+        self._lock = threading.Lock()
+
+    def _remaining(self, now):
+        while self._spent and self._spent[0][0] < now - 3600:
+            self._spent.popleft()
+        return self.tokens_per_hour - sum(tokens for _, tokens in self._spent)
+
+    def available(self):
+        with self._lock:
+            return self._remaining(time.time()) > 0
+
+    def charge(self, tokens):
+        with self._lock:
+            self._spent.append((time.time(), tokens))
+
+
+_budget = TokenBudget()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculation")
+        return _pool
+
+
+def _misses(spans, prefix):
+    """True if a span whose stage starts with `prefix` missed its cache, i.e.
+    really called the model or really ran the code."""
+    return any(span["stage"].startswith(prefix) and span["stage"] != "llm.code.similar"
+               and span.get("cache") == "miss" for span in spans)
+
+
+def _precompute(df, dataset_key, query, out_of_core, cancelled):
+    """
+    Runs the code generation, execution and analysis steps for one query,
+    stopping between steps once cancelled or out of budget. Every step goes
+    through the normal caches, so the foreground path later replays it; only
+    steps that missed those caches are charged to the budget. Returns the
+    result cache key if this speculation stored the result, else None.
+    """
+    def proceed():
+        return not cancelled.is_set() and _budget.available()
+
+    if not proceed():
+        return None
+    # A private trace tells which steps were served by the caches.
+    trace = start_trace(speculation=True)
+    try:
+        code = generate_pandas_code(df, query, out_of_core=out_of_core)
+        if _misses(trace.spans, "llm."):
+            _budget.charge(CODE_PROMPT_TOKENS + estimate_tokens(query + str(df.columns.tolist()) + code))
+        if not code or code.startswith("Error generating code") or not proceed():
+            return None
+
+        start = len(trace.spans)
+        try:
+            result = execute_cached(code, df, dataset_key, out_of_core=out_of_core)
+        except Exception:
+            return None
+        # Results that were already cached may belong to other sessions: only
+        # a result this speculation computed is ever evicted on cancel.
+        key = result_key(dataset_key, code) if _misses(trace.spans[start:], "exec") else None
+        if result is None or not proceed():
+            return key
+
+        start = len(trace.spans)
+        context = build_result_context(result)
+        analysis = generate_markdown_analysis(prompt_question=query, data_context=context)
+        if _misses(trace.spans[start:], "llm."):
+            _budget.charge(estimate_tokens(query + context + analysis))
+        return key
+    finally:
+        end_trace(trace)
+
+
+class SpeculationSet:
+    """Background answers to one session's recommended queries."""
+
+    def __init__(self, dataset_key, queries, futures, cancelled):
+        self.dataset_key = dataset_key
+        self.queries = queries
+        self._futures = futures
+        self._cancelled = cancelled
+        self._claimed = set()
+
+    def matches(self, dataset_key, queries):
+        return self.dataset_key == dataset_key and self.queries == queries
+
+    def claim(self, query):
+        """
+        Marks `query` as used and returns its future if the work is running or
+        done. Work that has not started yet is cancelled and None is returned:
+        computing it directly is faster than waiting behind the other queries.
+        """
+        future = self._futures.get(query)
+        if future is None or future.cancel():
+            return None
+        self._claimed.add(query)
+        return future
+
+    def cancel(self):
+        """Stops pending work and evicts the results nobody asked for."""
+        self._cancelled.set()
+        cache = get_result_cache()
+        for query, future in self._futures.items():
+            if query in self._claimed or future.cancel():
+                continue
+            future.add_done_callback(lambda f: _evict(cache, f))
+
+
+def _evict(cache, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    if future.result():
+        cache.discard(future.result())
+
+
+def speculate(df, dataset_key, queries, out_of_core=False):
+    """Starts precomputing the answers to `queries` in the background."""
+    cancelled = threading.Event()
+    pool = _get_pool()
+    futures = {
+        query: pool.submit(_precompute, df, dataset_key, query, out_of_core, cancelled)
+        for query in queries
+    }
+    return SpeculationSet(dataset_key, list(queries), futures, cancelled)
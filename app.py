@@ -1,24 +1,42 @@
+from monitoring.startup import mark
 import streamlit as st
 import pandas as pd
-import google.generativeai as genai
 import os
+import threading
 from dotenv import load_dotenv
-import plotly.express as px
 import plotly.graph_objects as go 
 import io
 from agent_logic.analysis_agent import (
+    configure_model,
+    warm_up_client,
     generate_pandas_code, 
     generate_overview_analysis,  # Replaces generate_analysis
-    generate_markdown_analysis,
-    generate_recommendations
+    stream_overview_analysis,
+    stream_markdown_analysis,
+    stream_recommendations
 )
-from report_builder.pdf_generator import build_pdf_report
+from agent_logic.fanout import stream_in_background
+from agent_logic import speculation
+from agent_logic.context_builder import build_overview_context, build_result_context
+from report_builder.cart_store import CartStore, CartFullError
+from data_engine.ingestion import dataset_key_for, load_csv
+from data_engine.registry import get_dataset_registry
+from data_engine.out_of_core import load_out_of_core
+from data_engine.result_cache import execute_cached
+from data_engine.validation import execute_progressive
+from monitoring.tracing import current_trace, end_trace, stage, start_trace, summarize
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+mark("imports")
 
 
 load_dotenv()
+# Pre-initialize the model client, report stack and chart renderer in the
+# background once the first page is on screen.
+WARM_UP = os.getenv("INSIGHT_WARM_UP", "1") != "0"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    # The Gemini SDK is imported on first use, not here.
+    configure_model(GEMINI_API_KEY)
 else:
     st.error("GEMINI_API_KEY not found in environment variables.")
     st.stop()
@@ -28,44 +46,129 @@ def main():
     st.title("Data Analysis AI Agent 🤖")
 
     if "report_cart" not in st.session_state:
-        st.session_state.report_cart = []
+        # Only handles live in the session; results are stored on disk.
+        st.session_state.report_cart = CartStore()
     if "df" not in st.session_state:
         st.session_state.df = None
+    if "dataset_file_id" not in st.session_state:
+        st.session_state.dataset_file_id = None
+        st.session_state.dataset_key = None
+        st.session_state.dataset_out_of_core = False
+        st.session_state.dataset_compact = None
+        st.session_state.memory_report = None
 
     uploaded_file = st.file_uploader("Upload your CSV file here:", type="csv")
+    out_of_core = st.checkbox(
+        "Out-of-core mode (for files larger than memory)",
+        help="Converts the file to a partitioned on-disk dataset and answers queries by scanning it in batches."
+    )
+    compact = st.checkbox(
+        "Compact memory (smaller column types)", disabled=out_of_core,
+        help="Stores text as Arrow strings (categories when very repetitive), parses dates and "
+             "downcasts numbers. Some generated code may need adjusting to these types."
+    )
+    speculate = st.checkbox(
+        "Precompute recommended queries", value=speculation.ENABLED_BY_DEFAULT,
+        help="Answers the recommendations in the background so clicking one is instant. Uses extra model requests."
+    )
+    progressive = st.checkbox(
+        "Check code and preview on a sample first", value=True, disabled=out_of_core,
+        help="Rejects code with unknown columns or functions before running it, and shows an approximate "
+             "result from a sample of a large file while the full computation runs."
+    )
+    mark("first_render")
 
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
-            st.session_state.df = df
+            # Only parse when a new file is uploaded; reruns reuse the session frame.
+            if (st.session_state.dataset_file_id != uploaded_file.file_id
+                    or st.session_state.dataset_out_of_core != out_of_core
+                    or st.session_state.dataset_compact != compact):
+                memory_report = None
+                if st.session_state.get("dataset_lease"):
+                    st.session_state.dataset_lease.release()
+                    st.session_state.dataset_lease = None
+                if out_of_core:
+                    # df only holds the first rows; queries scan the on-disk dataset.
+                    _, df, dataset_key = load_out_of_core(uploaded_file)
+                else:
+                    # Sessions uploading the same file share one copy-on-write frame.
+                    dataset_key = dataset_key_for(uploaded_file, compact)
+                    loaded_report = {}
+                    lease = get_dataset_registry().acquire(
+                        dataset_key,
+                        lambda: load_csv(uploaded_file, compact=compact, report=loaded_report,
+                                         dataset_key=dataset_key)[0]
+                    )
+                    memory_report = lease.metadata("memory_report", lambda _: loaded_report)
+                    st.session_state.dataset_lease = lease
+                    df = lease.df
+                st.session_state.df = df
+                st.session_state.dataset_key = dataset_key
+                st.session_state.dataset_file_id = uploaded_file.file_id
+                st.session_state.dataset_out_of_core = out_of_core
+                st.session_state.dataset_compact = compact
+                st.session_state.memory_report = memory_report
+            df = st.session_state.df
             
             st.success("File uploaded successfully!")
+            if out_of_core:
+                st.caption(f"Out-of-core mode: overview and schema are based on the first {len(df)} rows.")
+            elif st.session_state.memory_report:
+                report = st.session_state.memory_report
+                st.caption(
+                    f"Memory: {report['before_bytes'] / 1024**2:.1f} MB → "
+                    f"{report['after_bytes'] / 1024**2:.1f} MB"
+                    + (f" ({len(report['columns'])} columns compacted)" if report["columns"] else "")
+                )
             st.write("Here is a preview of your data (first 5 rows):")
             st.dataframe(df.head())
             
             st.info("🧠 Generating data overview...")
-            overview_context = f"Data Head:\n{df.head().to_string()}\n\nData Types:\n{df.dtypes.to_string()}"
-            overview_prompt = "What is this data about? Give a one-sentence summary."
-            overview = generate_overview_analysis(overview_context)
-            st.write(overview)
+            overview_context = dataset_metadata("overview_context", build_overview_context)
+            # Overview and recommendations are independent: both requests start
+            # now and run side by side, so this takes as long as the slowest one.
+            overview_stream = stream_in_background(stream_overview_analysis, overview_context)
+            recommendation_stream = stream_in_background(stream_recommendations, overview_context)
+
+            # Streamed: the summary renders as it is written.
+            overview = st.write_stream(overview_stream)
+            st.session_state.overview = overview
             
             st.divider()
 
 
             st.subheader("Recommendations")
-            recommendations = generate_recommendations(overview_context)
-            for rec in recommendations:
-                st.code(rec)
+            # Each suggestion is shown as soon as the model has finished it.
+            recommendations = []
+            for i, rec in enumerate(recommendation_stream):
+                if rec.startswith("Error generating"):
+                    st.error(rec)
+                    continue
+                st.button(rec, key=f"recommendation_{i}", on_click=ask_query, args=(rec,))
+                recommendations.append(rec)
+            update_speculation(speculate, df, recommendations, out_of_core)
 
             st.divider()
 
             query = st.text_input(
                 "Ask a question about your data:", 
-                placeholder="e.g., 'What is the average sales per region?'"
+                placeholder="e.g., 'What is the average sales per region?'",
+                key="query"
             )
 
             if query:
-                generated_code = generate_pandas_code(df, query)
+                speculated = st.session_state.get("speculation")
+                pending = speculated.claim(query) if speculated else None
+                if pending:
+                    # Let the running speculation finish; everything below then hits the caches.
+                    with st.spinner("🧠 Agent is thinking..."):
+                        try:
+                            pending.result()
+                        except Exception:
+                            pass
+                with st.spinner("🧠 Agent is thinking..."):
+                    generated_code = generate_pandas_code(df, query, out_of_core=out_of_core)
 
                 if generated_code:
                     with st.expander("🤖 Show Agent's Generated Code"):
@@ -74,32 +177,34 @@ def main():
                     st.write("### 📊 Result")
                     
                     try:
-                        exec_vars = {'df': df, 'pd': pd, 'px': px}
-                        exec(generated_code, exec_vars, exec_vars)
-                        result = exec_vars.get('result')
-
-                        if result is None:
-                            st.warning("The agent ran code, but did not produce a 'result'.")
-                        elif isinstance(result, go.Figure):
-                            st.write("Here is the chart you asked for:")
-                            st.plotly_chart(result, use_container_width=True)
-                        elif isinstance(result, (pd.DataFrame, pd.Series)):
-                            st.write("Here is the data you asked for:")
-                            st.dataframe(result)
+                        if progressive and not out_of_core:
+                            preview = st.empty()
+
+                            def show_sample(sample_result, rows):
+                                with preview.container():
+                                    st.caption(f"⏳ Approximate result on a sample of {rows:,} of {len(df):,} rows; "
+                                               "the full computation is running...")
+                                    show_result(sample_result)
+
+                            result = execute_progressive(generated_code, df, st.session_state.dataset_key,
+                                                         on_sample=show_sample)
+                            preview.empty()
                         else:
-                            st.write("Here is the result:")
-                            st.write(result)
+                            result = execute_cached(generated_code, df, st.session_state.dataset_key,
+                                                    out_of_core=out_of_core)
+
+                        with stage("display", result_type=type(result).__name__):
+                            show_result(result)
                         
                         if result is not None:
                             st.info("🧠 Generating chart analysis...")
-                            analysis_context = str(result)
+                            analysis_context = build_result_context(result)
                             analysis_prompt = query
 
-                            analysis = generate_markdown_analysis(
+                            analysis = st.write_stream(stream_markdown_analysis(
                                 prompt_question=analysis_prompt,
                                 data_context=analysis_context
-                            )
-                            st.write(analysis, unsafe_allow_html=True)
+                            ))
 
                             if st.button("Add to Report 🛒", key=query):
                                 item_type = "data"
@@ -110,16 +215,17 @@ def main():
                                 else:
                                     item_type = "value"
                                 
-                                new_item = {
-                                    "query": query,
-                                    "code": generated_code,
-                                    "result": result,
-                                    "analysis": analysis,
-                                    "type": item_type 
-                                }
-                                
-                                st.session_state.report_cart.append(new_item)
-                                st.toast("Added to report!", icon="✅")
+                                try:
+                                    st.session_state.report_cart.add(
+                                        query=query,
+                                        code=generated_code,
+                                        result=result,
+                                        analysis=analysis,
+                                        item_type=item_type
+                                    )
+                                    st.toast("Added to report!", icon="✅")
+                                except CartFullError as e:
+                                    st.warning(str(e))
                                 
                     except Exception as e:
                         st.error(f"Error executing or displaying code: {e}")
@@ -143,24 +249,37 @@ def main():
         st.divider()
     st.sidebar.title("Report Builder 📄")
     st.sidebar.write(f"Items in report: {len(st.session_state.report_cart)}")
+    if len(st.session_state.report_cart) and st.sidebar.button("Clear Report"):
+        st.session_state.report_cart.clear()
+        st.rerun()
 
     if st.sidebar.button("Generate PDF Report"):
         if st.session_state.df is None:
             st.sidebar.error("No data loaded. Please upload a file.")
-        elif not st.session_state.report_cart:
+        elif not len(st.session_state.report_cart):
             st.sidebar.error("No items in the report. Please add some analysis first.")
         else:
             st.sidebar.info("Generating PDF report... this may take a moment.")
             
-            df_head = st.session_state.df.head()
-            overview_context = f"Data Head:\n{st.session_state.df.head().to_string()}\n\nData Types:\n{st.session_state.df.dtypes.to_string()}"
-            main_overview = generate_overview_analysis(overview_context)
+            df_head = dataset_metadata("head", lambda df: df.head())
+            # Already generated after upload; only recomputed if it is missing.
+            main_overview = st.session_state.get("overview") or generate_overview_analysis(
+                dataset_metadata("overview_context", build_overview_context))
+
+            # Imported here so the report stack does not slow down start-up.
+            from report_builder.pdf_generator import build_pdf_report
 
+            timings = {}
             pdf_bytes = build_pdf_report(
                 dataset_name=uploaded_file.name if uploaded_file else "Uploaded Data",
                 main_overview=main_overview,
                 data_head=df_head,
-                report_cart=st.session_state.report_cart
+                report_cart=list(st.session_state.report_cart),
+                pipelined=True,
+                timings=timings
+            )
+            st.sidebar.caption(
+                "Build time: " + ", ".join(f"{stage} {secs:.1f}s" for stage, secs in timings.items())
             )
 
             st.sidebar.download_button(
@@ -168,6 +287,116 @@ def main():
                 data=pdf_bytes,
                 file_name="data_analysis_report.pdf",
                 mime="application/pdf")
-    
+
+    show_performance_panel()
+    mark("script_end")
+    if WARM_UP:
+        start_warm_up()
+
+
+def _load_report_stack():
+    import plotly.express  # noqa: F401
+    import report_builder.pdf_generator  # noqa: F401
+
+
+def _start_renderer():
+    from report_builder.render_service import get_render_service
+    get_render_service().start()
+
+
+def warm_up():
+    """Loads what the first query and the first report would otherwise wait for."""
+    steps = [
+        ("model_client", warm_up_client),
+        ("report_stack", _load_report_stack),
+        ("renderer", _start_renderer),
+    ]
+    for name, step in steps:
+        try:
+            step()
+            mark(f"warm_up.{name}")
+        except Exception:
+            pass  # Best effort: whatever is not warmed up loads on first use.
+    mark("warm_up.done")
+
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """Starts the warm-up once per server process, after the first page is sent."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def dataset_metadata(name, compute):
+    """compute(df) for the session's dataset, shared with every session that
+    uploaded the same file."""
+    lease = st.session_state.get("dataset_lease")
+    if lease is not None:
+        return lease.metadata(name, compute)
+    return compute(st.session_state.df)
+
+
+def show_result(result):
+    if result is None:
+        st.warning("The agent ran code, but did not produce a 'result'.")
+    elif isinstance(result, go.Figure):
+        st.write("Here is the chart you asked for:")
+        st.plotly_chart(result, use_container_width=True)
+    elif isinstance(result, (pd.DataFrame, pd.Series)):
+        st.write("Here is the data you asked for:")
+        st.dataframe(result)
+    else:
+        st.write("Here is the result:")
+        st.write(result)
+
+
+def ask_query(query):
+    """Fills the question box, e.g. from a recommendation button."""
+    st.session_state.query = query
+
+
+def update_speculation(enabled, df, recommendations, out_of_core):
+    """Starts, replaces or stops the background answers to the recommendations."""
+    current = st.session_state.get("speculation")
+    dataset_key = st.session_state.dataset_key
+    if current and (not enabled or not current.matches(dataset_key, recommendations)):
+        current.cancel()
+        current = None
+    if enabled and current is None and recommendations:
+        current = speculation.speculate(df, dataset_key, recommendations, out_of_core=out_of_core)
+    st.session_state.speculation = current
+
+
+def show_performance_panel():
+    """Sidebar breakdown of where this interaction and this session spent time."""
+    trace = current_trace()
+    spans = trace.spans if trace else []
+    with st.sidebar.expander("⏱️ Performance"):
+        if spans:
+            st.caption("This interaction")
+            st.dataframe(pd.DataFrame(spans).set_index("stage"))
+        history = st.session_state.get("trace_spans", []) + spans
+        if history:
+            st.caption("Session (per stage)")
+            st.dataframe(pd.DataFrame.from_dict(summarize(history), orient="index"))
+        registry = get_dataset_registry().stats()
+        st.caption(f"Shared datasets: {registry['datasets']} ({registry['in_use']} in use, "
+                   f"{registry['bytes'] / 1024**2:.1f} MB)")
+
+
+def run_traced():
+    """Runs one script execution inside a latency trace for this session."""
+    ctx = get_script_run_ctx()
+    trace = start_trace(session_id=ctx.session_id if ctx else None)
+    try:
+        main()
+    finally:
+        end_trace(trace)
+        # Keep a bounded history of spans for the session breakdown.
+        history = st.session_state.get("trace_spans", []) + trace.spans
+        st.session_state.trace_spans = history[-500:]
+
+
 if __name__ == "__main__":
-    main()
+    run_traced()
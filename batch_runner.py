@@ -0,0 +1,222 @@
+"""
+Headless batch analysis: one PDF report per dataset for a fixed question list.
+
+    python batch_runner.py manifest.json [--workers 8] [--max-model-requests 4]
+
+The manifest is a JSON file:
+
+    {
+        "datasets": ["data/sales.csv", "data/stock.csv"],
+        "queries": ["What is the average sales per region?", "Plot sales by month"],
+        "output_dir": "reports"
+    }
+
+Each report is named after its dataset's path relative to the datasets'
+common directory (e.g. 2024-01-01__sales.pdf). Progress is recorded in
+<output_dir>/progress.jsonl, so an interrupted run can be restarted and only
+the datasets without a complete report are processed. A dataset with any
+failed query or analysis is not recorded, so the next run retries it.
+"""
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import plotly.graph_objects as go
+from dotenv import load_dotenv
+
+from agent_logic.analysis_agent import (
+    generate_pandas_code,
+    generate_overview_analysis,
+    generate_markdown_analysis,
+    set_request_limiter,
+    configure_model
+)
+from agent_logic.fanout import submit
+from agent_logic.context_builder import build_overview_context, build_result_context
+from data_engine.executor import run_inline
+from data_engine.ingestion import load_csv
+from data_engine.storage import atomic_write
+from report_builder.pdf_generator import build_pdf_report
+
+
+PROGRESS_FILE = "progress.jsonl"
+# Prefix of the text the analysis functions return when the model call failed.
+ANALYSIS_ERROR = "Error analyzing data"
+
+
+def _init_worker(limiter):
+    """Runs once in each worker process."""
+    # Every query runs on a view of the same frame (see run_inline).
+    pd.options.mode.copy_on_write = True
+    load_dotenv()
+    configure_model(os.getenv("GEMINI_API_KEY"))
+    set_request_limiter(limiter)
+
+
+def _item_type(result):
+    if isinstance(result, go.Figure):
+        return "plot"
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return "data"
+    return "value"
+
+
+def _report_names(paths):
+    """
+    PDF file name for each dataset, built from its path relative to the
+    datasets' common directory, so 2024-01-01/sales.csv and
+    2024-01-02/sales.csv get distinct reports.
+    """
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    names = {}
+    for path in paths:
+        relative = os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0]
+        names[path] = relative.replace(os.sep, "__") + ".pdf"
+    return names
+
+
+def process_dataset(path, queries, output_dir, report_name):
+    """Answers every query on one CSV and writes its PDF report."""
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        df, _ = load_csv(io.BytesIO(f.read()))
+
+    # Runs while the queries are answered.
+    overview_future = submit(generate_overview_analysis, build_overview_context(df))
+    cart, failures = [], []
+    for query in queries:
+        code = generate_pandas_code(df, query)
+        try:
+            if not code or code.startswith("Error generating code"):
+                raise RuntimeError(code or "No code generated.")
+            result = run_inline(code, df)
+            if result is None:
+                raise RuntimeError("The generated code did not produce a 'result'.")
+        except Exception as e:
+            failures.append({"query": query, "error": str(e)})
+            continue
+        analysis = generate_markdown_analysis(
+            prompt_question=query,
+            data_context=build_result_context(result)
+        )
+        if analysis.startswith(ANALYSIS_ERROR):
+            failures.append({"query": query, "error": analysis})
+        cart.append({"query": query, "code": code, "result": result,
+                     "analysis": analysis, "type": _item_type(result)})
+
+    overview = overview_future.result()
+    if overview.startswith(ANALYSIS_ERROR):
+        failures.append({"query": "overview", "error": overview})
+    pdf_bytes = build_pdf_report(
+        dataset_name=os.path.basename(path),
+        main_overview=overview,
+        data_head=df.head(),
+        report_cart=cart,
+        pipelined=True
+    )
+    pdf_path = os.path.join(output_dir, report_name)
+
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_bytes)
+
+    atomic_write(pdf_path, write)
+    return {"dataset": path, "pdf": pdf_path, "items": len(cart), "failures": failures,
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+def _run_id(queries):
+    """Identifies the question list, so changing it invalidates old progress."""
+    return hashlib.sha256(json.dumps(queries).encode("utf-8")).hexdigest()[:12]
+
+
+def _completed(progress_path, run_id):
+    done = set()
+    if os.path.exists(progress_path):
+        with open(progress_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("run_id") == run_id and os.path.exists(record["pdf"]):
+                    done.add(record["dataset"])
+    return done
+
+
+def run_batch(manifest, workers=None, max_model_requests=4):
+    """Processes every dataset of the manifest in a process pool."""
+    queries = manifest["queries"]
+    output_dir = manifest.get("output_dir", "reports")
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    run_id = _run_id(queries)
+
+    # Names come from the whole manifest, so they do not change on a restart.
+    report_names = _report_names(manifest["datasets"])
+    done = _completed(progress_path, run_id)
+    pending = [path for path in manifest["datasets"] if path not in done]
+    print(f"{len(done)} datasets already done, {len(pending)} to process.", flush=True)
+    if not pending:
+        return []
+
+    ctx = multiprocessing.get_context("spawn")
+    # Shared by all workers: at most max_model_requests calls in flight.
+    limiter = ctx.BoundedSemaphore(max_model_requests)
+    summaries = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(limiter,)) as pool:
+        futures = {pool.submit(process_dataset, path, queries, output_dir, report_names[path]): path
+                   for path in pending}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                print(f"FAILED {path}: {e}", flush=True)
+                continue
+            summaries.append(summary)
+            if summary["failures"]:
+                # Not recorded as done: the next run processes it again.
+                print(f"INCOMPLETE {path} -> {summary['pdf']} ({len(summary['failures'])} failed: "
+                      f"{summary['failures'][0]['error']})", flush=True)
+                continue
+            with open(progress_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"run_id": run_id, **summary}) + "\n")
+            print(f"done {path} -> {summary['pdf']} ({summary['items']} items, {summary['seconds']}s)",
+                  flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(summaries)} reports in {elapsed:.1f}s "
+          f"({len(summaries) / elapsed * 60:.1f} datasets/min).", flush=True)
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate one PDF report per dataset in a manifest.")
+    parser.add_argument("manifest", help="JSON manifest with datasets, queries and output_dir")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--max-model-requests", type=int, default=4,
+                        help="concurrent model requests across all workers")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if not os.getenv("GEMINI_API_KEY"):
+        print("GEMINI_API_KEY not found in environment variables.", file=sys.stderr)
+        return 1
+    with open(args.manifest, encoding="utf-8") as f:
+        manifest = json.load(f)
+    run_batch(manifest, workers=args.workers, max_model_requests=args.max_model_requests)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+CATEGORIES = ["A", "B", "C", "D", "E", "F", "G", "H"]
+CHUNK_ROWS = 1_000_000
+
+
+def _chunk(rng, start, rows):
+    """One block of rows with mixed dtypes and a few missing values."""
+    amount = rng.gamma(2.0, 50.0, rows).round(2)
+    amount[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        "id": np.arange(start, start + rows),
+        "category": rng.choice(CATEGORIES, rows),
+        "amount": amount,
+        "quantity": rng.integers(1, 20, rows),
+        "created_at": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, rows), unit="s"),
+        "is_return": rng.random(rows) < 0.05,
+        "comment": rng.choice(["ok", "late delivery", "damaged box", "great service", ""], rows),
+    })
+
+
+def synthetic_csv(directory, rows, seed=0):
+    """Writes (once) and returns the path of a deterministic CSV with `rows` rows."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic_{rows}_{seed}.csv")
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    tmp_path = path + ".tmp"
+    # Written in chunks so the 10M-row file never has to fit in memory at once.
+    for start in range(0, rows, CHUNK_ROWS):
+        chunk = _chunk(rng, start, min(CHUNK_ROWS, rows - start))
+        chunk.to_csv(tmp_path, mode="a" if start else "w", header=not start, index=False)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,178 @@
+"""
+Headless performance benchmarks for the ingestion, execution and PDF paths.
+
+    python -m benchmarks.run_benchmarks                  # 10k, 100k, 1M rows
+    python -m benchmarks.run_benchmarks --full           # also 10M rows
+    python -m benchmarks.run_benchmarks --save-baseline  # record a new baseline
+
+Model calls go to a local deterministic stub (see stub_model.py), so results
+only depend on this code and the machine, plus the simulated --latency.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Caches must point somewhere fresh before any project module reads its config.
+os.environ.setdefault("INSIGHT_CACHE_DIR", tempfile.mkdtemp(prefix="insight_bench_"))
+os.environ.setdefault("INSIGHT_LLM_CACHE", "0")
+
+from agent_logic.analysis_agent import generate_markdown_analysis, generate_pandas_code
+from benchmarks.datasets import synthetic_csv
+from benchmarks.stub_model import ANALYSIS_TEXT, install_stub
+from data_engine.executor import run_inline
+from data_engine.ingestion import dataset_path, hash_bytes, load_csv
+from report_builder.pdf_generator import build_pdf_report
+from report_builder.pdf_utils import convert_df_to_table, convert_plot_to_image, markdown_to_pdf_html
+
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+FULL_SIZES = DEFAULT_SIZES + [10_000_000]
+DEFAULT_CARTS = [1, 5, 20]
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+QUERIES = ["What is the average amount per category?", "Plot amount by category", "Show the first 5 rows"]
+
+
+def measure(fn, repeat):
+    """Runs fn `repeat` times for latency, then once under tracemalloc for peak memory."""
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"latency_s": statistics.median(latencies), "peak_mb": peak / 1024**2}
+
+
+def _can_render():
+    try:
+        import plotly.express as px
+        convert_plot_to_image(px.bar(x=[1], y=[1]))
+        return True
+    except Exception:
+        return False
+
+
+def run_size(rows, args, results):
+    csv_path = synthetic_csv(args.data_dir, rows)
+    with open(csv_path, "rb") as f:
+        data = f.read()
+
+    cached_path = dataset_path(hash_bytes(data))
+
+    def parse_cold():
+        # Drop the ingestion cache entry so the CSV is really parsed.
+        if os.path.exists(cached_path):
+            os.remove(cached_path)
+        load_csv(io.BytesIO(data))
+
+    def add(stage, stats, items=None):
+        if items:
+            stats["throughput_per_s"] = items / stats["latency_s"] if stats["latency_s"] else None
+        results[f"{stage}@{rows}"] = stats
+        print(f"{stage:<28}{rows:>11,}  {stats['latency_s'] * 1000:>10.1f} ms  "
+              f"{stats['peak_mb']:>9.1f} MB", flush=True)
+
+    add("parse.cold", measure(parse_cold, args.repeat), rows)
+    add("parse.cached", measure(lambda: load_csv(io.BytesIO(data)), args.repeat), rows)
+    df, _ = load_csv(io.BytesIO(data))
+
+    def codegen_exec(query):
+        return run_inline(generate_pandas_code(df, query), df)
+
+    add("codegen+exec.table", measure(lambda: codegen_exec(QUERIES[0]), args.repeat), rows)
+    add("codegen+exec.plot", measure(lambda: codegen_exec(QUERIES[1]), args.repeat), rows)
+    add("convert_df_to_table", measure(lambda: convert_df_to_table(df, is_snapshot=True), args.repeat), rows)
+    if args.render:
+        figure = codegen_exec(QUERIES[1])
+        add("convert_plot_to_image", measure(lambda: convert_plot_to_image(figure), args.repeat))
+
+    queries = QUERIES if args.render else [QUERIES[0], QUERIES[2]]
+    for cart_size in args.carts:
+        cart = []
+        for i in range(cart_size):
+            query = queries[i % len(queries)]
+            result = codegen_exec(query)
+            item_type = "plot" if query == QUERIES[1] else "data"
+            analysis = generate_markdown_analysis(query, str(result)[:500])
+            cart.append({"query": query, "code": "", "result": result, "analysis": analysis, "type": item_type})
+
+        def build():
+            build_pdf_report("bench.csv", "Overview.", df.head(), cart, pipelined=True)
+
+        add(f"build_pdf_report.cart{cart_size}", measure(build, args.repeat), cart_size)
+
+
+def compare(results, baseline, tolerance):
+    """Prints stages slower than baseline by more than `tolerance`; returns them."""
+    regressions = []
+    for name, stats in results.items():
+        reference = baseline.get(name)
+        if not reference or not reference["latency_s"]:
+            continue
+        change = stats["latency_s"] / reference["latency_s"] - 1
+        if change > tolerance:
+            regressions.append(name)
+        print(f"{name:<44}{change:>+8.1%}{'  REGRESSION' if change > tolerance else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", help="row counts (default 10k 100k 1M)")
+    parser.add_argument("--full", action="store_true", help="include the 10M-row dataset")
+    parser.add_argument("--carts", type=int, nargs="+", default=DEFAULT_CARTS, help="report cart sizes")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated model latency in seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "insight_bench_data"))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline")
+    parser.add_argument("--output", help="write the raw results as JSON")
+    args = parser.parse_args(argv)
+
+    install_stub(args.latency)
+    args.render = _can_render()
+    if not args.render:
+        print("Chart rendering unavailable (no Chromium): image stages are skipped.")
+
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+    results = {}
+    print(f"{'stage':<28}{'rows':>11}  {'latency':>13}  {'peak mem':>12}")
+    for rows in sizes:
+        run_size(rows, args, results)
+    stats = measure(lambda: markdown_to_pdf_html(ANALYSIS_TEXT * 20), args.repeat)
+    results["markdown_to_pdf_html"] = stats
+    print(f"{'markdown_to_pdf_html':<39}  {stats['latency_s'] * 1000:>10.1f} ms  {stats['peak_mb']:>9.1f} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        return 1 if regressions else 0
+    # Timings depend on the machine, so no baseline is committed: record one
+    # locally before comparing.
+    print(f"No baseline at {args.baseline}: no comparison was made. "
+          f"Record one with --save-baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import re
+import time
+
+import google.generativeai as genai
+
+from agent_logic.prompts import SYSTEM_PROMPT
+
+
+# Canned answers keyed by what the prompt asks for. They are deterministic so
+# every benchmark run exercises exactly the same code paths.
+ANALYSIS_TEXT = """### Key Finding
+**Category B leads on average amount.**
+
+### Detailed Analysis
+The grouped averages are close, with a small spread between *categories*.
+
+### Business Impact
+* Focus promotion on the leading category.
+* Monitor the laggards monthly.
+"""
+OVERVIEW_TEXT = "This synthetic dataset records transactions with amounts, categories and timestamps."
+RECOMMENDATIONS_TEXT = "['What is the average amount per category?', 'Plot amount by category', 'Show the first 5 rows']"
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGenerativeModel:
+    """
+    Drop-in stand-in for genai.GenerativeModel: no network, a configurable
+    simulated latency and deterministic answers.
+    """
+
+    latency = 0.0
+
+    def __init__(self, model_name, system_instruction=None, generation_config=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.generation_config = generation_config
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        time.sleep(self.latency)
+        text = self._answer(prompt)
+        if stream:
+            # Roughly token-sized chunks, like a streamed model answer.
+            return [StubResponse(text[i:i + 16]) for i in range(0, len(text), 16)]
+        return StubResponse(text)
+
+    def _answer(self, prompt):
+        if self.system_instruction == SYSTEM_PROMPT:
+            return self._code(prompt)
+        if self.generation_config and "Return ONLY a JSON list" in prompt:
+            count = len(re.findall(r"^\s*\d+\. ", prompt, flags=re.MULTILINE))
+            return "[" + ", ".join(f'"Section {i + 1}"' for i in range(count)) + "]"
+        if "section heading" in prompt:
+            return "Section Title"
+        if "follow-up questions" in prompt:
+            return RECOMMENDATIONS_TEXT
+        if "2-3 sentence summary" in prompt:
+            return OVERVIEW_TEXT
+        return ANALYSIS_TEXT
+
+    @staticmethod
+    def _code(prompt):
+        query = re.search(r'query: "(.*)"', prompt).group(1).lower()
+        if "plot" in query:
+            return ("data = df.groupby('category')['amount'].mean().reset_index()\n"
+                    "result = px.bar(data, x='category', y='amount', template='plotly_dark')")
+        if "histogram" in query:
+            return "result = px.histogram(df, x='amount', template='plotly_dark')"
+        if "rows" in query:
+            return "result = df.head()"
+        return "result = df.groupby('category')['amount'].mean().reset_index()"
+
+
+def install_stub(latency=0.0):
+    """Routes every agent model call to the stub with `latency` seconds delay."""
+    StubGenerativeModel.latency = latency
+    genai.GenerativeModel = StubGenerativeModel
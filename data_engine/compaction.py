@@ -0,0 +1,96 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Text becomes Arrow-backed strings, which behave like text in generated code
+# (concatenation, .str). Only columns with very few distinct values (at most
+# this share of the rows) become categoricals.
+CATEGORY_RATIO = 0.01
+# Integers are not downcast below this type, so arithmetic in generated code
+# (e.g. df['qty'] * 1000) does not silently overflow.
+MIN_INT_DTYPE = np.int32
+# Only text whose first values look like dates is tried as a datetime column.
+DATE_PATTERN = re.compile(r"^\s*(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4})")
+DATE_SAMPLE = 20
+
+
+def memory_usage(df):
+    """Deep memory footprint of a frame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def arrow_types_mapper(data_type):
+    """Reads Arrow strings back as Arrow-backed pandas strings, not objects."""
+    if data_type in (pa.string(), pa.large_string()):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def _compact_text(column):
+    if pd.api.types.infer_dtype(column, skipna=True) != "string":
+        return column  # Mixed types: keep as is rather than guess.
+
+    sample = column.dropna().head(DATE_SAMPLE)
+    if len(sample) and sample.str.match(DATE_PATTERN).all():
+        parsed = pd.to_datetime(column, errors="coerce")
+        if parsed.notna().sum() == column.notna().sum():
+            return parsed
+
+    if column.nunique(dropna=True) <= CATEGORY_RATIO * len(column):
+        return column.astype("category")
+    return column.astype(pd.StringDtype("pyarrow"))
+
+
+def _compact_integer(column):
+    if len(column) == 0:
+        return column
+    low, high = column.min(), column.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.dtype(dtype).itemsize < np.dtype(MIN_INT_DTYPE).itemsize:
+            continue
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return column.astype(dtype)
+    return column
+
+
+def _compact_float(column):
+    narrow = column.astype(np.float32)
+    # Only when float32 holds every value exactly (e.g. prices with 2 decimals
+    # do not qualify; counts stored as floats do).
+    same = (narrow.astype(np.float64) == column) | (narrow.isna() & column.isna())
+    return narrow if same.all() else column
+
+
+def compact_dataframe(df):
+    """
+    Returns a copy of df with compact dtypes and a report of the change:
+    text as Arrow strings (categoricals for very few distinct values), date-like
+    text parsed to datetimes, integers downcast and floats narrowed to float32
+    when that is lossless.
+    """
+    compacted = {}
+    changes = {}
+    for name, column in df.items():
+        if column.dtype == object:
+            new = _compact_text(column)
+        elif pd.api.types.is_integer_dtype(column.dtype) and column.dtype.kind == "i":
+            new = _compact_integer(column)
+        elif column.dtype == np.float64:
+            new = _compact_float(column)
+        else:
+            new = column
+        if new.dtype != column.dtype:
+            changes[str(name)] = f"{column.dtype} -> {new.dtype}"
+        compacted[name] = new
+
+    result = pd.DataFrame(compacted, index=df.index)
+    report = {
+        "before_bytes": memory_usage(df),
+        "after_bytes": memory_usage(result),
+        "columns": changes,
+    }
+    return result, report
@@ -0,0 +1,281 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+# Maximum number of data points a figure may carry to the browser or to the
+# PDF renderer. Larger traces are replaced by pre-aggregated equivalents.
+POINT_BUDGET = int(os.getenv("INSIGHT_FIGURE_POINT_BUDGET", 20000))
+MAX_HISTOGRAM_BINS = 200
+# Trace attributes that hold one value per point and must be subset together
+# with x/y when a scatter trace is decimated.
+PER_POINT_ATTRS = ("text", "hovertext", "customdata", "ids")
+PER_POINT_MARKER_ATTRS = ("color", "size", "symbol", "opacity")
+# Attributes carried over when a histogram trace is replaced by a bar trace.
+BAR_PASSTHROUGH_ATTRS = (
+    "name", "legendgroup", "showlegend", "marker", "opacity", "xaxis", "yaxis",
+    "offsetgroup", "alignmentgroup", "hovertemplate", "visible",
+)
+HISTFUNCS = {"count": "count", "sum": "sum", "avg": "mean", "min": "min", "max": "max"}
+
+
+def _length(values):
+    return 0 if values is None or np.ndim(values) == 0 else len(values)
+
+
+def _trace_points(trace):
+    return max(_length(getattr(trace, "x", None)), _length(getattr(trace, "y", None)))
+
+
+def _as_numeric(values):
+    """Returns (float array, kind) where kind is 'number', 'datetime' or None."""
+    array = np.asarray(values)
+    if array.dtype.kind in "iufb":
+        return array.astype(float), "number"
+    if array.dtype.kind == "M":
+        return array.astype("datetime64[ns]").astype("int64").astype(float), "datetime"
+    if array.dtype.kind == "O":
+        try:
+            return np.asarray(pd.to_numeric(pd.Series(array)), dtype=float), "number"
+        except (TypeError, ValueError):
+            return None, None
+    return None, None
+
+
+def _from_numeric(values, kind):
+    if kind == "datetime":
+        return pd.to_datetime(values.astype("int64"))
+    return values
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of the
+    n_out points that best preserve the visual shape of the (sorted) series.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    bucket_edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = bucket_edges[i], bucket_edges[i + 1]
+        next_end = bucket_edges[i + 2] if i + 2 < len(bucket_edges) else n
+        next_start = end
+        # Average of the next bucket is the third vertex of the triangle.
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        bx, by = x[start:end], y[start:end]
+        areas = np.abs((x[previous] - avg_x) * (by - y[previous]) - (x[previous] - bx) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def _decimate_scatter(trace, budget):
+    n = _trace_points(trace)
+    y, _ = _as_numeric(trace.y) if trace.y is not None else (None, None)
+    x, _ = _as_numeric(trace.x) if trace.x is not None else (np.arange(n, dtype=float), None)
+
+    if x is None or y is None:
+        # Categorical axes: fall back to an even stride over the points.
+        keep = np.linspace(0, n - 1, budget).astype(int)
+    else:
+        order = np.argsort(x, kind="stable")
+        finite = order[np.isfinite(x[order]) & np.isfinite(y[order])]
+        keep = np.sort(finite[lttb_indices(x[finite], y[finite], budget)])
+
+    return _subset_points(trace, keep, n)
+
+
+def _thin_points(trace, budget):
+    """Keeps an even random sample of budget points; for traces whose points
+    are the chart itself (strip plots, rugs, box plots with all points)."""
+    n = _trace_points(trace)
+    keep = np.sort(np.random.default_rng(0).choice(n, size=budget, replace=False))
+    return _subset_points(trace, keep, n)
+
+
+def _subset_points(trace, keep, n):
+    updates = {}
+    for attr in ("x", "y") + PER_POINT_ATTRS:
+        values = getattr(trace, attr, None)
+        if _length(values) == n:
+            updates[attr] = np.asarray(values)[keep]
+    for attr in PER_POINT_MARKER_ATTRS:
+        values = trace.marker[attr]
+        if _length(values) == n:
+            updates[f"marker_{attr}"] = np.asarray(values)[keep]
+    trace.update(updates)
+    return trace
+
+
+def _bin_edges(values, trace, axis):
+    bins = getattr(trace, f"{axis}bins", None)
+    if bins is not None and bins.size and bins.start is not None and bins.end is not None:
+        try:
+            return np.arange(float(bins.start), float(bins.end) + float(bins.size), float(bins.size))
+        except (TypeError, ValueError):
+            pass
+    nbins = getattr(trace, f"nbins{axis}", None)
+    if nbins:
+        return np.histogram_bin_edges(values, bins=min(nbins, MAX_HISTOGRAM_BINS))
+    edges = np.histogram_bin_edges(values, bins="auto")
+    if len(edges) - 1 > MAX_HISTOGRAM_BINS:
+        edges = np.histogram_bin_edges(values, bins=MAX_HISTOGRAM_BINS)
+    return edges
+
+
+def _normalize(counts, widths, histnorm):
+    total = counts.sum()
+    if histnorm == "percent" and total:
+        return counts * 100.0 / total
+    if histnorm == "probability" and total:
+        return counts / total
+    if histnorm == "density":
+        return counts / widths
+    if histnorm == "probability density" and total:
+        return counts / (total * widths)
+    return counts
+
+
+def _histogram_axis(trace):
+    """Returns (axis holding the binned data, data values) of a histogram."""
+    horizontal = trace.x is None or trace.orientation == "h"
+    return ("y", trace.y) if horizontal else ("x", trace.x)
+
+
+def _shared_bin_edges(traces):
+    """
+    Histograms in the same bingroup (e.g. px.histogram with color=...) must
+    share their bins so the replacement bars stay aligned.
+    """
+    samples = {}
+    for trace in traces:
+        if trace.type != "histogram":
+            continue
+        axis, data = _histogram_axis(trace)
+        numeric, kind = _as_numeric(data)
+        if numeric is not None:
+            group = (trace.bingroup or "", axis, kind)
+            samples.setdefault(group, (trace, []))[1].append(numeric[np.isfinite(numeric)])
+    return {
+        group: _bin_edges(np.concatenate(arrays), trace, group[1])
+        for group, (trace, arrays) in samples.items()
+    }
+
+
+def _histogram_to_bar(trace, budget, shared_edges):
+    """Replaces a raw histogram trace by a bar trace of its binned values."""
+    axis, data = _histogram_axis(trace)
+    horizontal = axis == "y"
+    data = np.asarray(data)
+    weights = getattr(trace, "x" if horizontal else "y", None)
+    func = HISTFUNCS.get(trace.histfunc or "count") if weights is not None else "count"
+    if func is None:
+        return trace
+
+    numeric, kind = _as_numeric(data)
+    if numeric is not None:
+        mask = np.isfinite(numeric)
+        edges = shared_edges[(trace.bingroup or "", axis, kind)]
+        groups = pd.cut(pd.Series(numeric[mask]), edges, include_lowest=True)
+        positions = _from_numeric((edges[:-1] + edges[1:]) / 2, kind)
+        widths = np.diff(edges)
+        bar_widths = widths if kind == "number" else widths / 1e6  # datetime axes use ms
+    else:
+        mask = pd.notna(data)
+        groups = pd.Series(data[mask])
+        positions = None
+        if groups.nunique() > budget:
+            return trace
+        widths = 1.0
+        bar_widths = None
+
+    values = pd.Series(np.asarray(weights)[mask]) if weights is not None else pd.Series(np.ones(mask.sum()))
+    aggregated = values.groupby(groups.values, observed=False, sort=numeric is not None).agg(func)
+    if positions is None:
+        positions = aggregated.index.tolist()
+    counts = _normalize(aggregated.to_numpy(dtype=float), widths, trace.histnorm)
+
+    bar = go.Bar(orientation="h" if horizontal else "v")
+    for attr in BAR_PASSTHROUGH_ATTRS:
+        value = getattr(trace, attr, None)
+        if value is not None:
+            bar[attr] = value.to_plotly_json() if hasattr(value, "to_plotly_json") else value
+    bar["y" if horizontal else "x"] = positions
+    bar["x" if horizontal else "y"] = counts
+    if bar_widths is not None:
+        bar["width"] = bar_widths
+    return bar
+
+
+def _box_to_summary(trace):
+    """Replaces raw box-plot samples by precomputed quartiles per category."""
+    # Marginal boxes from plotly express leave orientation unset: the data
+    # axis is then whichever of x and y is given.
+    horizontal = trace.orientation == "h" or (trace.orientation is None and trace.y is None and trace.x is not None)
+    values = pd.to_numeric(pd.Series(trace.x if horizontal else trace.y), errors="coerce")
+    positions = trace.y if horizontal else trace.x
+    groups = pd.Series(positions) if positions is not None else pd.Series(np.zeros(len(values)))
+
+    stats = {"q1": [], "median": [], "q3": [], "lowerfence": [], "upperfence": [], "mean": []}
+    categories = []
+    for category, group in values.groupby(groups.values, sort=False):
+        group = group.dropna()
+        if group.empty:
+            continue
+        q1, median, q3 = group.quantile([0.25, 0.5, 0.75]).to_numpy()
+        iqr = q3 - q1
+        categories.append(category)
+        stats["q1"].append(q1)
+        stats["median"].append(median)
+        stats["q3"].append(q3)
+        stats["lowerfence"].append(group[group >= q1 - 1.5 * iqr].min())
+        stats["upperfence"].append(group[group <= q3 + 1.5 * iqr].max())
+        stats["mean"].append(group.mean())
+
+    trace.update(x=None, y=None, boxpoints=False, orientation="h" if horizontal else "v", **stats)
+    if positions is not None:
+        trace["y" if horizontal else "x"] = categories
+    return trace
+
+
+def decimate_figure(fig, point_budget=POINT_BUDGET):
+    """
+    Returns a figure whose traces fit in point_budget points in total.
+    Oversized histograms become binned bars, box plots become precomputed
+    quartile summaries (box traces showing all points, such as strip plots
+    and rugs, keep a sample of their points) and scatter/line traces are
+    LTTB-decimated. Traces
+    of other types, and figures already under budget, are left as they are.
+    """
+    sizes = [_trace_points(trace) for trace in fig.data]
+    total = sum(sizes)
+    if total <= point_budget:
+        return fig
+
+    shared_edges = _shared_bin_edges(fig.data)
+    traces = []
+    for trace, size in zip(fig.data, sizes):
+        # Each trace gets a share of the budget proportional to its size.
+        budget = max(int(point_budget * size / total), 3)
+        if size > budget:
+            if trace.type == "histogram":
+                trace = _histogram_to_bar(trace, budget, shared_edges)
+            elif trace.type == "box" and trace.boxpoints == "all":
+                trace = _thin_points(trace, budget)
+            elif trace.type == "box":
+                trace = _box_to_summary(trace)
+            elif trace.type in ("scatter", "scattergl"):
+                trace = _decimate_scatter(trace, budget)
+        traces.append(trace)
+
+    decimated = go.Figure(data=traces, layout=fig.layout)
+    if any(trace.type == "histogram" for trace in fig.data) and decimated.layout.bargap is None:
+        decimated.update_layout(bargap=0)
+    return decimated
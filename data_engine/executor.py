@@ -0,0 +1,271 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pads
+
+from .compaction import arrow_types_mapper
+from .decimation import decimate_figure
+from .ingestion import REPORT_METADATA_KEY, dataset_path
+from .out_of_core import open_dataset, partitioned_path
+
+
+# "inline" runs generated code inside the Streamlit process (the original
+# behaviour); "process" sends it to a pool of worker processes.
+EXECUTION_MODE = os.getenv("INSIGHT_EXECUTION_MODE", "inline")
+POOL_SIZE = int(os.getenv("INSIGHT_EXEC_WORKERS", os.cpu_count() or 2))
+QUERY_TIMEOUT = float(os.getenv("INSIGHT_EXEC_TIMEOUT", 60))
+# Limit on each worker's data segment (RLIMIT_DATA): its heap and anonymous
+# mappings, including about 100 MB for the interpreter and libraries. The
+# memory-mapped dataset is file-backed and does not count against it.
+MEMORY_LIMIT_MB = int(os.getenv("INSIGHT_EXEC_MEMORY_MB", 4096))
+ARROW_POOL_VARIABLE = "ARROW_DEFAULT_MEMORY_POOL"
+
+
+class ExecutionError(RuntimeError):
+    """Raised when generated code fails, times out or exceeds its limits."""
+
+
+class RowIndependentError(ExecutionError):
+    """Raised by the worker pool for failures that would happen on any rows
+    of the dataset (see fails_on_any_rows)."""
+
+
+def fails_on_any_rows(error):
+    """True for errors that do not depend on which rows the code ran on:
+    unknown names or imports, and missing attributes of pd, px or the frame
+    itself (any subset of rows has the same columns and dtypes)."""
+    if isinstance(error, (NameError, ImportError)):
+        return True
+    if isinstance(error, AttributeError):
+        import plotly.express as px
+        obj = getattr(error, "obj", None)
+        return obj is pd or obj is px or isinstance(obj, pd.DataFrame)
+    return False
+
+
+def run_inline(code, df):
+    """
+    Executes generated code against df in this process and returns `result`.
+    Figures are decimated to the point budget before anyone displays them.
+    The code gets its own shallow view of df; with pandas copy-on-write
+    enabled (see registry.py), in-place changes never leak into the session's
+    frame or the cached results of later queries.
+    """
+    import plotly.express as px  # Loaded on first use, not at start-up.
+    return _run({'df': df.copy(deep=False), 'pd': pd, 'px': px}, code)
+
+
+def run_out_of_core(code, dataset):
+    """Executes out-of-core generated code against the pyarrow dataset `ds`."""
+    import plotly.express as px
+    return _run({'ds': dataset, 'pa': pa, 'pc': pc, 'pads': pads, 'pd': pd, 'px': px}, code)
+
+
+def _run(exec_vars, code):
+    exec(code, exec_vars, exec_vars)
+    result = exec_vars.get('result')
+    if isinstance(result, go.Figure):
+        try:
+            result = decimate_figure(result)
+        except Exception:
+            pass  # Never fail a valid query over decimation: keep the full figure.
+    return result
+
+
+def encode_result(result):
+    """Serializes a result to (kind, payload) for another process or for disk."""
+    if isinstance(result, go.Figure):
+        return "figure", result.to_json()
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        kind = "series" if isinstance(result, pd.Series) else "frame"
+        frame = result.to_frame() if kind == "series" else result
+        try:
+            table = pa.Table.from_pandas(frame)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return kind, sink.getvalue().to_pybytes()
+        except (pa.ArrowException, TypeError, ValueError):
+            pass
+    return "value", pickle.dumps(result)
+
+
+def decode_result(kind, payload):
+    """Inverse of encode_result."""
+    if kind == "figure":
+        return pio.from_json(payload)
+    if kind in ("frame", "series"):
+        frame = pa.ipc.open_stream(payload).read_all().to_pandas()
+        return frame.iloc[:, 0] if kind == "series" else frame
+    return pickle.loads(payload)
+
+
+def _load_dataset(path):
+    """
+    Memory-maps the cached Arrow file; no pickled copy of the frame is sent.
+    A directory is a partitioned out-of-core dataset and is only opened.
+    """
+    if os.path.isdir(path):
+        return open_dataset(path)
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        compacted = REPORT_METADATA_KEY in (table.schema.metadata or {})
+        return table.to_pandas(split_blocks=True, types_mapper=arrow_types_mapper if compacted else None)
+
+
+def _worker_main(conn, memory_limit_mb):
+    # The worker keeps its frame across queries; copy-on-write keeps one
+    # query's in-place changes out of the next (see run_inline).
+    pd.options.mode.copy_on_write = True
+    try:
+        import resource
+        limit = memory_limit_mb * 1024**2
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ImportError, AttributeError, ValueError, OSError):
+        pass  # Not available on this platform: run without a memory cap.
+
+    loaded_path, df = None, None
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return  # The server closed the pipe (shutdown): exit quietly.
+        if message is None:
+            return
+        path, code, rows = message
+        try:
+            if path != loaded_path:
+                # Keep a single dataset per worker to bound its footprint.
+                loaded_path, df = None, None
+                df = _load_dataset(path)
+                loaded_path = path
+            if isinstance(df, pads.Dataset):
+                result = run_out_of_core(code, df)
+            else:
+                result = run_inline(code, df if rows is None else df.iloc[rows])
+            conn.send(("ok", encode_result(result)))
+        except MemoryError:
+            loaded_path, df = None, None
+            conn.send(("error", "The query exceeded the worker memory limit."))
+        except Exception as e:
+            conn.send(("invalid" if fails_on_any_rows(e) else "error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, memory_limit_mb), daemon=True)
+        # Arrow's default allocator (mimalloc) reserves about 1 GB of address
+        # space when pyarrow.dataset is imported, which RLIMIT_DATA counts as
+        # used. Workers use the system allocator; the variable must be set
+        # before the child imports pyarrow.
+        previous = os.environ.get(ARROW_POOL_VARIABLE)
+        os.environ[ARROW_POOL_VARIABLE] = "system"
+        try:
+            self.process.start()
+        finally:
+            if previous is None:
+                os.environ.pop(ARROW_POOL_VARIABLE, None)
+            else:
+                os.environ[ARROW_POOL_VARIABLE] = previous
+        child_conn.close()
+
+    def run(self, path, code, timeout, rows=None):
+        self.conn.send((path, code, rows))
+        if not self.conn.poll(timeout):
+            raise ExecutionError(f"The query took longer than {timeout:.0f}s and was stopped.")
+        try:
+            return self.conn.recv()
+        except (EOFError, ConnectionResetError):
+            raise ExecutionError("The worker process died while running the query (out of memory?).")
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ExecutionPool:
+    """
+    Pool of worker processes for generated code.
+    Workers memory-map the cached Arrow copy of the dataset, run the code with
+    a wall-clock and memory limit, and are replaced if they time out or die.
+    """
+
+    def __init__(self, size=POOL_SIZE, timeout=QUERY_TIMEOUT, memory_limit_mb=MEMORY_LIMIT_MB):
+        self.size = size
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        with self._lock:
+            if self._idle.empty() and self._created < self.size:
+                self._created += 1
+                return _Worker(self._ctx, self.memory_limit_mb)
+        return self._idle.get()
+
+    def run(self, code, path, rows=None):
+        """
+        Runs `code` against the dataset stored at `path` (only the rows at
+        positions `rows` if given) and returns `result`.
+        """
+        worker = self._checkout()
+        try:
+            status, payload = worker.run(path, code, self.timeout, rows)
+        except BaseException:
+            worker.kill()
+            with self._lock:
+                self._created -= 1
+            raise
+        self._idle.put(worker)
+        if status == "invalid":
+            raise RowIndependentError(payload)
+        if status == "error":
+            raise ExecutionError(payload)
+        return decode_result(*payload)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_execution_pool():
+    """Returns the process-wide execution pool, shared by all sessions."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExecutionPool()
+        return _pool
+
+
+def execute_code(code, df, dataset_key=None, out_of_core=False, rows=None):
+    """
+    Runs generated code and returns its `result`.
+    Uses the worker pool when enabled and the dataset has a cached Arrow copy
+    to share; otherwise runs inline. In out-of-core mode the code runs against
+    the partitioned dataset of `dataset_key` instead of `df`. `rows` restricts
+    an in-memory run to the rows at those positions (e.g. a sample).
+    """
+    if out_of_core:
+        path = partitioned_path(dataset_key)
+        if EXECUTION_MODE == "process":
+            return get_execution_pool().run(code, path)
+        return run_out_of_core(code, open_dataset(path))
+    if EXECUTION_MODE == "process" and dataset_key:
+        path = dataset_path(dataset_key)
+        if os.path.exists(path):
+            return get_execution_pool().run(code, path, rows)
+    return run_inline(code, df if rows is None else df.iloc[rows])
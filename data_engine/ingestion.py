@@ -0,0 +1,121 @@
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from monitoring.tracing import stage
+from .compaction import arrow_types_mapper, compact_dataframe, memory_usage
+from .storage import atomic_write, cache_dir, enforce_size_limit
+
+
+# Upper bound for the parsed-dataset cache on disk (default 2 GB).
+MAX_CACHE_BYTES = int(os.getenv("INSIGHT_DATASET_CACHE_BYTES", 2 * 1024**3))
+DATASET_SUFFIX = ".arrow"
+# Compacted copies are cached under their own key, so workers and the result
+# cache never mix them up with the default-dtype frame. The suffix changes
+# whenever the compaction rules do.
+COMPACT_KEY_SUFFIX = "-compact2"
+REPORT_METADATA_KEY = b"insight_compaction"
+
+
+def hash_bytes(data):
+    """Returns a short content hash used as the dataset cache key."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def dataset_path(dataset_key):
+    """Path of the Arrow IPC file holding the parsed dataset `dataset_key`."""
+    return os.path.join(cache_dir("datasets"), dataset_key + DATASET_SUFFIX)
+
+
+def dataset_key_for(uploaded_file, compact=False):
+    """The key load_csv uses for this upload: its content hash plus the mode."""
+    return hash_bytes(uploaded_file.getbuffer()) + (COMPACT_KEY_SUFFIX if compact else "")
+
+
+def _read_cached(path):
+    """
+    Memory-maps a cached Arrow IPC file and returns (df, compaction report).
+    The report is None for frames that were not compacted.
+    """
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        report = (table.schema.metadata or {}).get(REPORT_METADATA_KEY)
+        df = table.to_pandas(types_mapper=arrow_types_mapper if report else None)
+    # Bump the mtime so the LRU eviction sees this file as recently used.
+    os.utime(path)
+    return df, json.loads(report) if report else None
+
+
+def _write_cached(df, path, report=None):
+    """Stores a parsed DataFrame as an uncompressed Arrow IPC file (mmap-able)."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if report:
+        metadata = {**(table.schema.metadata or {}), REPORT_METADATA_KEY: json.dumps(report)}
+        table = table.replace_schema_metadata(metadata)
+
+    def write(tmp_path):
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    atomic_write(path, write)
+    enforce_size_limit(cache_dir("datasets"), MAX_CACHE_BYTES, suffix=DATASET_SUFFIX)
+
+
+def load_csv(uploaded_file, compact=False, report=None, dataset_key=None):
+    """
+    Parses an uploaded CSV once per distinct content.
+    Returns (df, dataset_key); later calls with the same bytes read the cached
+    Arrow copy instead of running pd.read_csv again.
+    With `compact` the frame gets compact dtypes (see compaction.py). If a
+    `report` dict is passed it is filled with the before/after memory footprint.
+    Pass the `dataset_key_for` key when the caller already has it, so the
+    upload is not hashed twice.
+    """
+    with stage("ingest", compact=compact) as span:
+        data = uploaded_file.getbuffer()
+        if dataset_key is None:
+            dataset_key = dataset_key_for(uploaded_file, compact)
+        path = dataset_path(dataset_key)
+        span["input_bytes"] = data.nbytes
+
+        if os.path.exists(path):
+            try:
+                df, compaction = _read_cached(path)
+                span.update(cache="hit", rows=len(df))
+                _fill_report(report, df, compaction)
+                return df, dataset_key
+            except (OSError, pa.ArrowException):
+                # Corrupt or concurrently evicted entry: fall through and re-parse.
+                pass
+
+        span["cache"] = "miss"
+        # The buffer is only copied when it really has to be parsed.
+        df = pd.read_csv(io.BytesIO(data))
+        compaction = None
+        if compact:
+            df, compaction = compact_dataframe(df)
+            span.update(before_bytes=compaction["before_bytes"], after_bytes=compaction["after_bytes"])
+        span["rows"] = len(df)
+        _fill_report(report, df, compaction)
+        try:
+            _write_cached(df, path, compaction)
+        except (OSError, pa.ArrowException):
+            # Mixed-type object columns can't always be converted to Arrow; the
+            # frame is still usable, it just won't be cached.
+            pass
+        return df, dataset_key
+
+
+def _fill_report(report, df, compaction):
+    if report is None:
+        return
+    if compaction:
+        report.update(compaction)
+    else:
+        size = memory_usage(df)
+        report.update(before_bytes=size, after_bytes=size, columns={})
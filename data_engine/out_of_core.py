@@ -0,0 +1,136 @@
+import os
+import re
+import shutil
+import tempfile
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as pads
+
+from monitoring.tracing import stage
+from .ingestion import hash_bytes
+from .storage import cache_dir, enforce_directory_size_limit
+
+
+# Rows per Parquet file / row group of the partitioned copy, and the number of
+# rows read back for the schema and head preview.
+PARTITION_ROWS = 1_000_000
+ROW_GROUP_ROWS = 128 * 1024
+PREVIEW_ROWS = 1000
+# CSV bytes read per batch; also the sample used to infer the column types.
+BLOCK_SIZE = 32 * 1024**2
+COMPLETE_MARKER = "_SUCCESS"
+# Byte budget for the partitioned copies (default 20 GB); least recently used
+# datasets are deleted beyond it.
+MAX_CACHE_BYTES = int(os.getenv("INSIGHT_PARTITIONED_CACHE_BYTES", 20 * 1024**3))
+# Column index in pyarrow's "In CSV column #3: ... conversion error" messages.
+FAILED_COLUMN = re.compile(r"CSV column #(\d+)")
+
+
+def partitioned_path(dataset_key):
+    """Directory holding the partitioned Parquet copy of dataset `dataset_key`."""
+    return os.path.join(cache_dir("partitioned"), dataset_key)
+
+
+def open_dataset(path):
+    return pads.dataset(path, format="parquet")
+
+
+def _widened_types(schema):
+    """Types to force on a retry: integers may turn out to hold floats or
+    overflow later in the file, and all-null columns may hold text."""
+    column_types = {}
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            column_types[field.name] = pa.float64()
+        elif pa.types.is_null(field.type):
+            column_types[field.name] = pa.string()
+    return column_types
+
+
+def _write_partitions(source, path, column_types=None):
+    """Streams the CSV batch by batch into Parquet files; never holds it all."""
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(block_size=BLOCK_SIZE),
+        convert_options=pacsv.ConvertOptions(column_types=column_types or {}),
+    )
+    schema = reader.schema
+    pads.write_dataset(
+        reader, path, format="parquet",
+        max_rows_per_file=PARTITION_ROWS,
+        max_rows_per_group=ROW_GROUP_ROWS,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return schema
+
+
+def _convert(buffer, path):
+    """
+    Writes the partitioned copy of the CSV in `buffer`. Types are inferred
+    from the first block; if they do not hold for the whole file, numbers are
+    widened first, then every column that still fails (e.g. one text value
+    late in a numeric column) is read as text.
+    """
+    schema, column_types = None, None
+    while True:
+        try:
+            return _write_partitions(pa.BufferReader(pa.py_buffer(buffer)), path, column_types)
+        except pa.ArrowInvalid as e:
+            shutil.rmtree(path, ignore_errors=True)
+            if column_types is None:
+                schema = pacsv.open_csv(
+                    pa.BufferReader(pa.py_buffer(buffer)),
+                    read_options=pacsv.ReadOptions(block_size=BLOCK_SIZE)).schema
+                column_types = _widened_types(schema)
+                continue
+            match = FAILED_COLUMN.search(str(e))
+            failed = schema.names[int(match.group(1))] if match else None
+            if failed is not None and column_types.get(failed) != pa.string():
+                column_types[failed] = pa.string()
+            elif any(column_types.get(name) != pa.string() for name in schema.names):
+                column_types = {name: pa.string() for name in schema.names}
+            else:
+                raise
+
+
+def load_out_of_core(uploaded_file):
+    """
+    Converts an uploaded CSV into a partitioned on-disk Parquet dataset, once
+    per distinct content. Returns (dataset, preview_df, dataset_key) where the
+    preview holds only the first rows, so memory stays bounded.
+    """
+    with stage("ingest", mode="out_of_core") as span:
+        buffer = uploaded_file.getbuffer()
+        dataset_key = hash_bytes(buffer)
+        path = partitioned_path(dataset_key)
+        span["input_bytes"] = buffer.nbytes
+
+        marker = os.path.join(path, COMPLETE_MARKER)
+        if os.path.exists(marker):
+            span["cache"] = "hit"
+            # Bump the marker so the LRU eviction sees this dataset as recently used.
+            os.utime(marker)
+        else:
+            span["cache"] = "miss"
+            # Private to this conversion: sessions converting the same file at
+            # once each write their own copy and the last rename wins.
+            tmp_path = tempfile.mkdtemp(dir=cache_dir("partitioned"), prefix=f"{dataset_key}.", suffix=".tmp")
+            try:
+                _convert(buffer, tmp_path)
+                open(os.path.join(tmp_path, COMPLETE_MARKER), "w").close()
+                if os.path.isdir(path) and not os.path.exists(marker):
+                    shutil.rmtree(path, ignore_errors=True)  # Incomplete leftover.
+                try:
+                    os.replace(tmp_path, path)
+                except OSError:
+                    if not os.path.exists(marker):
+                        raise  # Otherwise another session finished the same file first.
+            finally:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            enforce_directory_size_limit(cache_dir("partitioned"), MAX_CACHE_BYTES, COMPLETE_MARKER, keep=path)
+
+        dataset = open_dataset(path)
+        preview = dataset.head(PREVIEW_ROWS).to_pandas()
+        return dataset, preview, dataset_key
+
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+from .result_cache import estimate_size
+
+
+# Parsed datasets shared by every session of this server, keyed by content
+# hash. Frames nobody uses are evicted (least recently used first) once the
+# total exceeds this budget; frames in use are never dropped.
+MAX_REGISTRY_BYTES = int(os.getenv("INSIGHT_REGISTRY_BYTES", 2 * 1024**3))
+
+# Sessions get shallow views of one shared frame, which is only safe with
+# pandas copy-on-write: a write through a view (numpy, categorical, Arrow or
+# datetime columns alike) then copies the affected column for that view only.
+# It is a process-wide pandas setting, enabled by the process that shares
+# frames, i.e. whenever this module is used.
+pd.options.mode.copy_on_write = True
+
+
+class _Entry:
+    def __init__(self, df):
+        self.df = df
+        self.size = estimate_size(df)
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.metadata = {}
+        self.lock = threading.Lock()
+
+
+class DatasetLease:
+    """
+    One session's use of a registered dataset. `df` is a shallow view of the
+    shared frame and pandas copy-on-write (enabled above) keeps any change
+    made through it private to the session. The lease is released
+    explicitly or when collected.
+    """
+
+    def __init__(self, registry, dataset_key, df):
+        self.dataset_key = dataset_key
+        self.df = df
+        self._registry = registry
+        self._finalizer = weakref.finalize(self, registry.release, dataset_key)
+
+    def metadata(self, name, compute):
+        return self._registry.metadata(self.dataset_key, name, compute)
+
+    def release(self):
+        self._finalizer()
+
+
+class DatasetRegistry:
+    """Process-wide, reference-counted store of shared parsed frames."""
+
+    def __init__(self, max_bytes=MAX_REGISTRY_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, dataset_key, loader):
+        """
+        Returns a DatasetLease on `dataset_key`, calling loader() -> df only if
+        no session has it loaded. Concurrent first uploads of the same file
+        share a single load.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(dataset_key)
+                if entry is not None:
+                    entry.refs += 1
+                    entry.last_used = time.monotonic()
+                    return DatasetLease(self, dataset_key, entry.df.copy(deep=False))
+                loading = self._loading.get(dataset_key)
+                if loading is None:
+                    loading = self._loading[dataset_key] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            df = loader()
+            entry = _Entry(df)
+            entry.refs = 1
+            with self._lock:
+                self._entries[dataset_key] = entry
+                self._evict()
+            return DatasetLease(self, dataset_key, df.copy(deep=False))
+        finally:
+            with self._lock:
+                self._loading.pop(dataset_key).set()
+
+    def release(self, dataset_key):
+        with self._lock:
+            entry = self._entries.get(dataset_key)
+            if entry is None:
+                return
+            entry.refs = max(entry.refs - 1, 0)
+            entry.last_used = time.monotonic()
+            self._evict()
+
+    def metadata(self, dataset_key, name, compute):
+        """
+        Returns a per-dataset value (schema, head, overview context, ...),
+        computed once from the shared frame by compute(df) and then reused by
+        every session.
+        """
+        with self._lock:
+            entry = self._entries.get(dataset_key)
+        if entry is None:
+            raise KeyError(dataset_key)
+        with entry.lock:
+            if name not in entry.metadata:
+                entry.metadata[name] = compute(entry.df)
+            return entry.metadata[name]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "datasets": len(self._entries),
+                "in_use": sum(1 for entry in self._entries.values() if entry.refs),
+                "bytes": sum(entry.size for entry in self._entries.values()),
+            }
+
+    def _evict(self):
+        total = sum(entry.size for entry in self._entries.values())
+        idle = sorted((entry.last_used, key) for key, entry in self._entries.items() if entry.refs == 0)
+        for _, key in idle:
+            if total <= self.max_bytes:
+                break
+            total -= self._entries.pop(key).size
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_dataset_registry():
+    """Returns the process-wide dataset registry, shared by all sessions."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DatasetRegistry()
+        return _registry
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.graph_objects as go
+
+from monitoring.tracing import stage
+from .executor import EXECUTION_MODE, decode_result, encode_result, execute_code
+from .storage import atomic_write, cache_dir, enforce_size_limit
+
+
+# In-memory budget for materialized results (default 512 MB). Entries pushed
+# out of memory are spilled to disk when INSIGHT_RESULT_SPILL is enabled.
+MAX_MEMORY_BYTES = int(os.getenv("INSIGHT_RESULT_CACHE_BYTES", 512 * 1024**2))
+SPILL_TO_DISK = os.getenv("INSIGHT_RESULT_SPILL", "1") != "0"
+MAX_SPILL_BYTES = int(os.getenv("INSIGHT_RESULT_SPILL_BYTES", 2 * 1024**3))
+SPILL_SUFFIX = ".result"
+
+
+def result_key(dataset_key, code):
+    """Key of a result: the dataset content hash plus the hash of the code."""
+    return hashlib.blake2b(f"{dataset_key}\0{code}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def estimate_size(result):
+    """Approximate memory weight of a result, used for eviction."""
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, pd.Series):
+        return int(result.memory_usage(deep=True))
+    if isinstance(result, go.Figure):
+        size = 0
+        for trace in result.data:
+            for value in trace.to_plotly_json().values():
+                size += getattr(value, "nbytes", sys.getsizeof(value))
+        return size
+    return sys.getsizeof(result)
+
+
+class ResultCache:
+    """
+    Memory-weighted LRU of executed results, with optional spill to disk.
+    A result evicted from memory is written to the spill directory and
+    promoted back into memory on its next hit.
+    """
+
+    def __init__(self, max_memory_bytes=MAX_MEMORY_BYTES, spill_to_disk=SPILL_TO_DISK):
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_to_disk = spill_to_disk
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _spill_path(self, key):
+        return os.path.join(cache_dir("results"), key + SPILL_SUFFIX)
+
+    def get(self, key):
+        """Returns (True, result) on a hit, (False, None) otherwise."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True, self._entries[key][0]
+
+        if not self.spill_to_disk:
+            return False, None
+        path = self._spill_path(key)
+        try:
+            with open(path, "rb") as f:
+                result = decode_result(*pickle.load(f))
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+        os.utime(path)
+        self.put(key, result)
+        return True, result
+
+    def put(self, key, result):
+        size = estimate_size(result)
+        if size > self.max_memory_bytes:
+            self._spill(key, result)
+            return
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._memory_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                old_key, (old_result, old_size) = self._entries.popitem(last=False)
+                self._memory_bytes -= old_size
+                evicted.append((old_key, old_result))
+        # Spill outside the lock; serialization can be slow for big frames.
+        for old_key, old_result in evicted:
+            self._spill(old_key, old_result)
+
+    def discard(self, key):
+        """Drops a result from memory and disk."""
+        with self._lock:
+            if key in self._entries:
+                self._memory_bytes -= self._entries.pop(key)[1]
+        if self.spill_to_disk:
+            try:
+                os.remove(self._spill_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _spill(self, key, result):
+        if not self.spill_to_disk:
+            return
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                pickle.dump(encode_result(result), f)
+
+        try:
+            atomic_write(path, write)
+        except (OSError, pickle.PicklingError):
+            return
+        enforce_size_limit(cache_dir("results"), MAX_SPILL_BYTES, suffix=SPILL_SUFFIX)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Returns the process-wide result cache, shared by all sessions."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def execute_cached(code, df, dataset_key, out_of_core=False):
+    """
+    execute_code memoized on (dataset content hash, code): reruns that ask for
+    the same code on the same data return the stored result instantly.
+    """
+    with stage("exec", mode=EXECUTION_MODE, code_chars=len(code)) as span:
+        if not dataset_key:
+            span["cache"] = "off"
+            return execute_code(code, df, dataset_key, out_of_core)
+        cache = get_result_cache()
+        key = result_key(dataset_key, code)
+        found, result = cache.get(key)
+        span["cache"] = "hit" if found else "miss"
+        if not found:
+            result = execute_code(code, df, dataset_key, out_of_core)
+            if result is not None:
+                cache.put(key, result)
+        span.update(result_type=type(result).__name__, result_bytes=estimate_size(result))
+        return result
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+
+
+# Every on-disk cache lives under this root so a single env var can move them
+# all (e.g. onto a shared volume used by several workers).
+CACHE_ROOT = os.getenv("INSIGHT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "insight_data"))
+
+
+def cache_dir(name):
+    """Returns (and creates) the cache sub-directory called `name`."""
+    path = os.path.join(CACHE_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def atomic_write(path, write_fn):
+    """Calls write_fn(tmp_path) then renames the file into place, so readers in
+    other processes never observe a half-written file. The temporary name is
+    unique per call, so concurrent writers never share it."""
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def enforce_size_limit(directory, max_bytes, suffix=""):
+    """Deletes the least recently used files in `directory` until the total size
+    fits in max_bytes. Recency is the file mtime, which readers bump on a hit."""
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(suffix) or name.endswith(".tmp"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def enforce_directory_size_limit(directory, max_bytes, marker, keep=None):
+    """
+    Like enforce_size_limit for caches whose entries are sub-directories:
+    deletes the least recently used complete entries (recency is the mtime of
+    their `marker` file, which readers bump on a hit) except `keep`.
+    """
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith(".tmp") or path == keep:
+            continue
+        try:
+            used = os.stat(os.path.join(path, marker)).st_mtime
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        except (FileNotFoundError, NotADirectoryError):
+            continue  # Being written, or not a cache entry.
+        entries.append((used, size, path))
+
+    total = sum(size for _, size, _ in entries)
+    if keep and os.path.isdir(keep):
+        total += sum(entry.stat().st_size for entry in os.scandir(keep) if entry.is_file())
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
@@ -0,0 +1,152 @@
+import ast
+import os
+
+import numpy as np
+import pandas as pd
+
+from monitoring.tracing import stage
+from .executor import ExecutionError, RowIndependentError, execute_code, fails_on_any_rows
+from .result_cache import execute_cached, get_result_cache, result_key
+
+
+# Frames with more rows than this get a quick run on a stratified sample
+# before the full computation.
+SAMPLE_MIN_ROWS = int(os.getenv("INSIGHT_SAMPLE_MIN_ROWS", 200_000))
+SAMPLE_ROWS = int(os.getenv("INSIGHT_SAMPLE_ROWS", 10_000))
+# Keyword arguments of df methods that name columns.
+COLUMN_KEYWORDS = {"by", "columns", "column", "index", "values", "subset", "on", "x", "y", "id_vars", "value_vars"}
+# df methods whose positional string arguments are column names.
+COLUMN_METHODS = {"groupby", "sort_values", "value_counts", "drop_duplicates", "nlargest", "nsmallest",
+                  "set_index", "pivot_table", "pivot", "melt", "explode", "dropna"}
+
+
+class CodeValidationError(ExecutionError):
+    """Raised when generated code is rejected before the full run."""
+
+
+def _strings(node):
+    """String constants of a node that is a string or a list/tuple of strings."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [elt.value for elt in node.elts if isinstance(elt, ast.Constant) and isinstance(elt.value, str)]
+    return []
+
+
+def referenced_columns(tree):
+    """Column names the code reads directly from df: df['a'], df[['a', 'b']],
+    df.a and df.groupby('a') style arguments. Columns the code creates itself
+    (df['new'] = ...) are left out."""
+    columns, created = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "df":
+            (created if isinstance(node.ctx, ast.Store) else columns).update(_strings(node.slice))
+        elif (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+              and node.value.id == "df" and not hasattr(pd.DataFrame, node.attr)):
+            columns.add(node.attr)
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+              and isinstance(node.func.value, ast.Name) and node.func.value.id == "df"):
+            if node.func.attr in COLUMN_METHODS:
+                for arg in node.args[:1]:
+                    columns.update(_strings(arg))
+            for keyword in node.keywords:
+                if keyword.arg in COLUMN_KEYWORDS:
+                    columns.update(_strings(keyword.value))
+    return columns - created
+
+
+def _reassigns_df(tree):
+    return any(isinstance(node, ast.Name) and node.id == "df" and isinstance(node.ctx, ast.Store)
+               for node in ast.walk(tree))
+
+
+def validate_code(code, columns):
+    """
+    Static checks that take milliseconds: the code parses, assigns `result`,
+    only reads existing df columns and only uses existing pd/px functions.
+    Raises CodeValidationError listing every problem found.
+    """
+    import plotly.express as px  # Loaded on first use, not at start-up.
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise CodeValidationError(f"The generated code is not valid Python: {e}")
+
+    problems = []
+    known = {str(column) for column in columns}
+    # Once df itself is reassigned its columns can no longer be known statically.
+    referenced = set() if _reassigns_df(tree) else referenced_columns(tree)
+    missing = sorted(column for column in referenced if column not in known)
+    if missing:
+        problems.append(f"unknown column(s) {', '.join(map(repr, missing))}")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            module = {"pd": pd, "px": px}.get(node.value.id)
+            if module is not None and not hasattr(module, node.attr):
+                problems.append(f"{node.value.id}.{node.attr} does not exist")
+    if not any(isinstance(node, ast.Name) and node.id == "result" and isinstance(node.ctx, ast.Store)
+               for node in ast.walk(tree)):
+        problems.append("no 'result' variable is assigned")
+    if problems:
+        raise CodeValidationError("The generated code was rejected: " + "; ".join(problems) + ".")
+    return tree
+
+
+def sample_positions(df, tree, rows=SAMPLE_ROWS):
+    """
+    Positions of a random sample of about `rows` rows that keeps at least one
+    row of every group of the first low-cardinality column the code reads, so
+    grouped results show all their groups.
+    """
+    positions = np.sort(np.random.default_rng(0).choice(len(df), size=min(rows, len(df)), replace=False))
+    sample = df.iloc[positions]
+    for column in sorted(referenced_columns(tree)):
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if not (isinstance(series.dtype, (pd.CategoricalDtype, pd.StringDtype)) or series.dtype in (bool, object)):
+            continue
+        # Cardinality is estimated on the sample first: only columns with few
+        # distinct values there are scanned in full.
+        if sample[column].nunique(dropna=False) > rows // 10:
+            continue
+        firsts = np.flatnonzero(~series.duplicated().to_numpy())
+        if len(firsts) <= rows // 10:
+            return np.union1d(firsts, positions)
+    return positions
+
+
+def execute_progressive(code, df, dataset_key, on_sample=None):
+    """
+    Validates the code, then for large frames runs it on a stratified sample
+    and passes (sample_result, sample_rows) to `on_sample` before running the
+    full computation through the result cache. Code that breaks on the sample
+    in a way that cannot depend on the sampled rows is rejected without
+    touching the full frame; any other failure only skips the preview.
+    """
+    with stage("validate", code_chars=len(code)):
+        tree = validate_code(code, df.columns)
+
+    if dataset_key:
+        found, result = get_result_cache().get(result_key(dataset_key, code))
+        if found:
+            return result
+
+    if len(df) > SAMPLE_MIN_ROWS:
+        with stage("exec.sample", rows=SAMPLE_ROWS):
+            positions = sample_positions(df, tree)
+            # Same executor as the full run: in process mode the sample runs
+            # in a worker, under its time and memory limits.
+            try:
+                sample_result = execute_code(code, df, dataset_key, rows=positions)
+            except RowIndependentError as e:
+                raise CodeValidationError(f"The generated code failed on a sample: {e}")
+            except Exception as e:
+                if fails_on_any_rows(e):
+                    raise CodeValidationError(f"The generated code failed on a sample: {type(e).__name__}: {e}")
+                sample_result = None  # May be sample-specific; let the full run decide.
+        if sample_result is not None and on_sample:
+            on_sample(sample_result, len(positions))
+
+    return execute_cached(code, df, dataset_key)
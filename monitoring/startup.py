@@ -0,0 +1,134 @@
+"""
+Cold-start profiling.
+
+    python -m monitoring.startup
+
+Reports the import cost of every module app.py imports (measured with
+`python -X importtime` in a fresh interpreter) and the app's time to first
+render. With INSIGHT_STARTUP_PROFILE=1 a running server also prints its
+startup marks to stderr.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+
+PROFILE = os.getenv("INSIGHT_STARTUP_PROFILE", "0") == "1"
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+# Marks are relative to the first import of this module, which app.py does
+# before anything else, i.e. the start of the first script run.
+_started = time.perf_counter()
+_marks = {}
+
+
+def mark(name):
+    """Records the first time `name` is reached in this process."""
+    if name in _marks:
+        return
+    _marks[name] = round((time.perf_counter() - _started) * 1000, 1)
+    if PROFILE:
+        print(f"[startup] {name}: {_marks[name]} ms", file=sys.stderr, flush=True)
+
+
+def marks():
+    """Returns {mark: milliseconds since the first script run started}."""
+    return dict(_marks)
+
+
+def app_imports(path=APP_PATH):
+    """Absolute module names imported at the top level of app.py, in order."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def import_costs(modules, cwd=None):
+    """
+    Imports `modules` in order in a fresh interpreter and returns
+    [(module, cumulative_ms)]: the cost each one added on top of the
+    modules imported before it.
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd or os.path.dirname(APP_PATH), capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            # Later lines for the same name are nested re-imports; keep the first.
+            cumulative.setdefault(match.group(4), int(match.group(2)) / 1000)
+
+    costs = []
+    for module in modules:
+        # A dotted module is reported under its own name, or under the first
+        # parent package that was not imported yet.
+        parts = module.split(".")
+        names = [".".join(parts[:i]) for i in range(len(parts), 0, -1)]
+        cost = sum(cumulative.pop(name) for name in names if name in cumulative)
+        costs.append((module, round(cost, 1)))
+    return costs
+
+
+def time_to_first_render(path=APP_PATH, wait_warm_up=30):
+    """
+    Runs the app once with Streamlit's test harness in a fresh interpreter and
+    returns its startup marks, including the background warm-up if it
+    finishes within `wait_warm_up` seconds.
+    """
+    code = f"""
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+harness = round((time.perf_counter() - started) * 1000, 1)
+AppTest.from_file({path!r}, default_timeout=120).run()
+from monitoring import startup
+deadline = time.time() + {wait_warm_up}
+while "warm_up.done" not in startup.marks() and time.time() < deadline:
+    time.sleep(0.1)
+print(json.dumps({{"harness_import": harness, **startup.marks()}}))
+"""
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "startup-profile")
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=os.path.dirname(path),
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import cost and time to first render of app.py.")
+    parser.add_argument("--app", default=APP_PATH)
+    parser.add_argument("--top", type=int, default=15, help="modules to list")
+    args = parser.parse_args(argv)
+
+    costs = import_costs(app_imports(args.app), cwd=os.path.dirname(os.path.abspath(args.app)))
+    print(f"{'module':<45}{'import ms':>10}")
+    for module, cost in sorted(costs, key=lambda item: -item[1])[:args.top]:
+        print(f"{module:<45}{cost:>10.1f}")
+    print(f"{'total':<45}{sum(cost for _, cost in costs):>10.1f}")
+
+    print()
+    print(f"{'startup mark':<45}{'ms':>10}")
+    for name, value in time_to_first_render(os.path.abspath(args.app)).items():
+        print(f"{name:<45}{value:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+
+
+# Structured trace records are appended to this JSON lines file when set, so
+# stage latencies can be aggregated (p50/p99) across the whole fleet.
+TRACE_FILE = os.getenv("INSIGHT_TRACE_FILE")
+
+_current_trace = contextvars.ContextVar("insight_trace", default=None)
+_file_lock = threading.Lock()
+
+
+class Trace:
+    """All stage spans recorded while handling one request (one app rerun)."""
+
+    def __init__(self, session_id=None, **attrs):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.attrs = attrs
+        self.spans = []
+        self.token = None
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+def start_trace(session_id=None, **attrs):
+    """Starts a trace and makes it current for this thread/context."""
+    trace = Trace(session_id, **attrs)
+    trace.token = _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def end_trace(trace):
+    """Detaches the trace and exports its spans as JSON lines."""
+    _current_trace.reset(trace.token)
+    if not TRACE_FILE or not trace.spans:
+        return
+    lines = []
+    for span in trace.spans:
+        record = {"trace_id": trace.trace_id, "session_id": trace.session_id,
+                  "trace_started_at": trace.started_at, **trace.attrs, **span}
+        lines.append(json.dumps(record, default=str))
+    with _file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+@contextlib.contextmanager
+def stage(name, **attrs):
+    """
+    Times a pipeline stage and records it on the current trace.
+    Yields the span's attribute dict so callers can add cache hits or sizes.
+    Without an active trace the block still runs and nothing is recorded.
+    """
+    span = dict(attrs)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield span
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        trace = _current_trace.get()
+        if trace is not None:
+            span.update(stage=name, status=status,
+                        duration_ms=round((time.perf_counter() - started) * 1000, 3))
+            trace.add(span)
+
+
+def bind_context(fn):
+    """Wraps fn so it runs in a copy of the caller's context (and trace),
+    e.g. when handed to a thread pool."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def summarize(spans):
+    """Returns {stage: {count, p50_ms, p99_ms, total_ms}} for a list of spans."""
+    durations = {}
+    for span in spans:
+        durations.setdefault(span["stage"], []).append(span["duration_ms"])
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": round(float(np.percentile(values, 50)), 1),
+            "p99_ms": round(float(np.percentile(values, 99)), 1),
+            "total_ms": round(float(np.sum(values)), 1),
+        }
+        for name, values in sorted(durations.items())
+    }
+
+
+if __name__ == "__main__":
+    # python -m monitoring.tracing traces.jsonl  -> per-stage p50/p99 table
+    with open(sys.argv[1], encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    print(f"{'stage':<24}{'count':>8}{'p50 ms':>12}{'p99 ms':>12}")
+    for name, stats in summarize(records).items():
+        print(f"{name:<24}{stats['count']:>8}{stats['p50_ms']:>12}{stats['p99_ms']:>12}")
@@ -0,0 +1,136 @@
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+import weakref
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_engine.result_cache import estimate_size
+from data_engine.storage import atomic_write, cache_dir
+
+
+# Each session keeps only small results in memory (within this budget) and
+# writes everything else to its own directory, up to the disk budget.
+SESSION_MEMORY_BYTES = int(os.getenv("INSIGHT_CART_MEMORY_BYTES", 1024**2))
+SESSION_DISK_BYTES = int(os.getenv("INSIGHT_CART_DISK_BYTES", 512 * 1024**2))
+INLINE_MAX_BYTES = 16 * 1024
+
+
+class CartFullError(RuntimeError):
+    """Raised when an item would exceed the session's cart disk budget."""
+
+
+def _write_result(result, path_base):
+    """Writes a result in its compact form; returns (path, format)."""
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        frame = result.to_frame() if isinstance(result, pd.Series) else result
+        try:
+            table = pa.Table.from_pandas(frame)
+            path = path_base + ".parquet"
+            atomic_write(path, lambda tmp_path: pq.write_table(table, tmp_path, compression="zstd"))
+            return path, "series" if isinstance(result, pd.Series) else "frame"
+        except (pa.ArrowException, TypeError, ValueError):
+            pass  # Mixed-type columns: stored with pickle below.
+    if isinstance(result, go.Figure):
+        path = path_base + ".json"
+
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(result.to_json())
+
+        atomic_write(path, write)
+        return path, "figure"
+
+    path = path_base + ".pickle"
+
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f)
+
+    atomic_write(path, write)
+    return path, "pickle"
+
+
+def load_result(item):
+    """
+    Returns the result of a cart item: the live object of a plain item dict,
+    or the value read back from the cart store for a handle.
+    """
+    if "result" in item:
+        return item["result"]
+    ref = item["ref"]
+    if "inline" in ref:
+        return ref["inline"]
+    if ref["format"] in ("frame", "series"):
+        frame = pq.read_table(ref["path"]).to_pandas()
+        return frame.iloc[:, 0] if ref["format"] == "series" else frame
+    if ref["format"] == "figure":
+        with open(ref["path"], encoding="utf-8") as f:
+            return pio.from_json(f.read())
+    with open(ref["path"], "rb") as f:
+        return pickle.load(f)
+
+
+class CartStore:
+    """
+    A session's report cart. Results are serialized when added (Parquet for
+    tables, figure JSON for charts, pickle otherwise) and the cart only holds
+    lightweight handles: dicts with query, code, analysis, type and a `ref` to
+    the stored result. The directory is removed when the store is collected.
+    """
+
+    def __init__(self, memory_budget=SESSION_MEMORY_BYTES, disk_budget=SESSION_DISK_BYTES):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.directory = tempfile.mkdtemp(dir=cache_dir("carts"))
+        self._items = []
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    @property
+    def memory_bytes(self):
+        return sum(item["ref"].get("bytes", 0) for item in self._items if "inline" in item["ref"])
+
+    @property
+    def disk_bytes(self):
+        return sum(item["ref"].get("bytes", 0) for item in self._items if "path" in item["ref"])
+
+    def add(self, query, code, result, analysis, item_type):
+        """Stores a result and appends its handle to the cart."""
+        size = estimate_size(result)
+        # Figures always go to disk: their template and layout are not counted
+        # by estimate_size and outweigh small trace data.
+        inline = not isinstance(result, go.Figure) and size <= INLINE_MAX_BYTES
+        if inline and self.memory_bytes + size <= self.memory_budget:
+            ref = {"inline": result, "bytes": size}
+        else:
+            path, kind = _write_result(result, os.path.join(self.directory, uuid.uuid4().hex))
+            stored = os.path.getsize(path)
+            if self.disk_bytes + stored > self.disk_budget:
+                os.remove(path)
+                raise CartFullError("The report is full; generate it or clear it before adding more.")
+            ref = {"path": path, "format": kind, "bytes": stored}
+        item = {"query": query, "code": code, "analysis": analysis, "type": item_type, "ref": ref}
+        self._items.append(item)
+        return item
+
+    def clear(self):
+        """Removes every item and its stored result."""
+        for item in self._items:
+            if "path" in item["ref"]:
+                try:
+                    os.remove(item["ref"]["path"])
+                except FileNotFoundError:
+                    pass
+        self._items = []
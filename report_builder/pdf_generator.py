@@ -1,4 +1,6 @@
 import io
+import time
+from concurrent.futures import ThreadPoolExecutor
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -8,14 +10,19 @@ from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.enums import TA_JUSTIFY
 
 # Import project modules
-from .pdf_utils import convert_df_to_table, convert_plot_to_image, markdown_to_pdf_html
-from agent_logic.analysis_agent import get_professionnal_title
+from .cart_store import load_result
+from .pdf_utils import convert_df_to_table, convert_plot_to_image, convert_plots_to_images, markdown_to_pdf_html
+from agent_logic.analysis_agent import get_professionnal_titles
+from monitoring.tracing import bind_context, stage
 
 
-def build_pdf_report(dataset_name, main_overview , data_head , report_cart):
-    """Builds a PDF report from the provided components."""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, leftMargin=0.5*inch, rightMargin=0.5*inch, topMargin=0.75*inch, bottomMargin=0.75*inch,title=f"Data Analysis Report - {dataset_name}")
+# Worker pool size for table formatting in the pipelined build. All titles come
+# from a single batched model call and all charts from one render-service batch.
+TABLE_WORKERS = 4
+
+
+def _build_styles():
+    """Returns the stylesheet shared by every report."""
     styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(
         name='MainTitle',
@@ -49,7 +56,125 @@ def build_pdf_report(dataset_name, main_overview , data_head , report_cart):
         alignment=TA_JUSTIFY,
         spaceAfter=12
     ))
-    
+    return styles
+
+
+def _render_item(item):
+    """Renders the heavy part of a cart item: the chart image or the table.
+    Stored results are only loaded here, one item at a time."""
+    if item['type'] == 'plot':
+        return convert_plot_to_image(load_result(item))
+    if item['type'] == 'data':
+        return convert_df_to_table(load_result(item), is_snapshot=True)
+    return None
+
+
+def _render_plots(items):
+    """Renders every chart item in one render-service batch."""
+    return convert_plots_to_images([load_result(item) for item in items])
+
+
+def _item_story(item, title, content, styles):
+    """Lays out one cart item section from its already computed parts."""
+    story = [Paragraph(title, styles['SectionTitle'])]
+
+    if item['type'] in ('plot', 'data'):
+        if content:
+            story.append(content)
+    elif item['type'] == 'value':
+        value_text = str(load_result(item))
+        story.append(Paragraph(value_text, styles['BodyText']))
+
+    story.append(Spacer(1, 0.15*inch))
+    analysis_html = markdown_to_pdf_html(item['analysis'])
+    story.append(Paragraph(analysis_html, styles['AnalysisText']))
+    story.append(Spacer(1, 0.25*inch))
+    return story
+
+
+def _run_stage(pool, fn, items):
+    """
+    Submits fn(item) for every item and returns (futures, finished_at), where
+    finished_at collects the completion time of each task for the timings.
+    """
+    finished_at = []
+
+    def task(item):
+        try:
+            return fn(item)
+        finally:
+            finished_at.append(time.perf_counter())
+
+    return [pool.submit(bind_context(task), item) for item in items], finished_at
+
+
+def _pipelined_sections(report_cart, timings):
+    """
+    Fetches all titles, renders all images and builds all tables concurrently.
+    Returns (titles, contents) in cart order once every stage has finished.
+    """
+    plots = [i for i, item in enumerate(report_cart) if item['type'] == 'plot']
+    tables = [i for i, item in enumerate(report_cart) if item['type'] == 'data']
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(1) as title_pool, \
+            ThreadPoolExecutor(1) as render_pool, \
+            ThreadPoolExecutor(TABLE_WORKERS) as table_pool:
+        title_futures, title_ends = _run_stage(
+            title_pool, get_professionnal_titles, [[item['query'] for item in report_cart]])
+        image_futures, image_ends = _run_stage(
+            render_pool, _render_plots, [[report_cart[i] for i in plots]])
+        table_futures, table_ends = _run_stage(
+            table_pool, _render_item, [report_cart[i] for i in tables])
+
+        titles = title_futures[0].result()
+        contents = [None] * len(report_cart)
+        for i, image in zip(plots, image_futures[0].result()):
+            contents[i] = image
+        for i, future in zip(tables, table_futures):
+            contents[i] = future.result()
+
+    for stage, ends in (('titles', title_ends), ('images', image_ends), ('tables', table_ends)):
+        timings[stage] = max(ends) - started if ends else 0.0
+    return titles, contents
+
+
+def _sequential_sections(report_cart, timings):
+    """Original one-item-at-a-time path; timings hold the summed stage costs."""
+    started = time.perf_counter()
+    titles = get_professionnal_titles([item['query'] for item in report_cart])
+    timings['titles'] = time.perf_counter() - started
+
+    contents = []
+    timings['images'] = timings['tables'] = 0.0
+    for item in report_cart:
+        rendered = time.perf_counter()
+        contents.append(_render_item(item))
+        stage = 'images' if item['type'] == 'plot' else 'tables'
+        timings[stage] += time.perf_counter() - rendered
+    return titles, contents
+
+
+def build_pdf_report(dataset_name, main_overview , data_head , report_cart, pipelined=False, timings=None):
+    """
+    Builds a PDF report from the provided components.
+    Cart items are dicts with a live 'result' or CartStore handles, whose
+    results are loaded from disk only when their section is built.
+    With pipelined=True the batched title call, chart renders and tables run
+    concurrently in bounded pools. If a `timings` dict is given it is filled
+    with the seconds spent per stage.
+    """
+    timings = {} if timings is None else timings
+    build_started = time.perf_counter()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, leftMargin=0.5*inch, rightMargin=0.5*inch, topMargin=0.75*inch, bottomMargin=0.75*inch,title=f"Data Analysis Report - {dataset_name}")
+    styles = _build_styles()
+
+    if pipelined:
+        titles, contents = _pipelined_sections(report_cart, timings)
+    else:
+        titles, contents = _sequential_sections(report_cart, timings)
+
     story = []
 
     story.append(Paragraph("Data Analysis Report", styles['MainTitle']))
@@ -63,31 +188,16 @@ def build_pdf_report(dataset_name, main_overview , data_head , report_cart):
     story.append(Spacer(1, 0.15*inch))
 
     story.append(Paragraph("Detailed Analysis", styles['h1']))
-    for item in report_cart:
-        # Generate section title from query
-        title = get_professionnal_title(item['query'])
-        story.append(Paragraph(title, styles['SectionTitle']))
-        
-        if item['type'] == 'plot':
-            img = convert_plot_to_image(item['result'])
-            if img:
-                story.append(img)
-                
-        elif item['type'] == 'data':
-            tbl = convert_df_to_table(item['result'], is_snapshot=True)
-            story.append(tbl)
-            
-        elif item['type'] == 'value':
-            value_text = str(item['result'])
-            story.append(Paragraph(value_text, styles['BodyText']))
-        
-        story.append(Spacer(1, 0.15*inch))
-        analysis_html = markdown_to_pdf_html(item['analysis'])
-        story.append(Paragraph(analysis_html, styles['AnalysisText']))
-        story.append(Spacer(1, 0.25*inch))
-
-    doc.build(story)
+    # Assemble in cart order, whatever order the sections finished in.
+    for item, title, content in zip(report_cart, titles, contents):
+        story.extend(_item_story(item, title, content, styles))
+
+    layout_started = time.perf_counter()
+    with stage("pdf.layout", items=len(report_cart)):
+        doc.build(story)
+    timings['layout'] = time.perf_counter() - layout_started
 
     pdf_bytes = buffer.getvalue()
     buffer.close()
+    timings['total'] = time.perf_counter() - build_started
     return pdf_bytes
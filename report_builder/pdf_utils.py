@@ -8,25 +8,54 @@ from reportlab.lib.units import inch
 from reportlab.lib import colors
 import re
 
+from .render_service import get_render_service
 
-def convert_df_to_table(data_object, is_snapshot=False):
-    """Convert a pandas DataFrame to a nicely spaced ReportLab Table object."""
 
-    df = data_object.to_frame() if isinstance(data_object, pd.Series) else data_object.copy()
+# Row budget for tables embedded in a report: larger results are shown as
+# their head and tail with an "N more rows" line in between.
+MAX_TABLE_ROWS = 50
 
-    def format_cell(x):
-        if pd.isna(x):
-            return ''
-        s = str(x)
-        max_len = 40 if is_snapshot else 100
-        trunc_len = 37 if is_snapshot else 97
-        return (s[:trunc_len] + '...') if len(s) > max_len else s
 
-    for col in df.columns:
-        df[col] = df[col].map(format_cell)
+def _format_column(column, max_len, trunc_len):
+    """Vectorized cell formatting: blanks for NaN and '...' truncation."""
+    text = column.astype(str).mask(column.isna(), '')
+    lengths = text.str.len()
+    too_long = lengths > max_len
+    if too_long.any():
+        text = text.mask(too_long, text.str.slice(0, trunc_len) + '...')
+        lengths = lengths.clip(upper=max_len)
+    return text.tolist(), int(lengths.max()) if len(lengths) else 0
 
-    data = [df.columns.tolist()] + df.values.tolist()
-    num_cols = len(df.columns)
+
+def convert_df_to_table(data_object, is_snapshot=False, max_rows=MAX_TABLE_ROWS):
+    """
+    Convert a pandas DataFrame to a nicely spaced ReportLab Table object.
+    Only `max_rows` rows (head and tail) are laid out.
+    """
+
+    df = data_object.to_frame() if isinstance(data_object, pd.Series) else data_object
+    max_len = 40 if is_snapshot else 100
+    trunc_len = 37 if is_snapshot else 97
+
+    omitted = 0
+    if len(df) > max_rows:
+        head_rows = (max_rows + 1) // 2
+        omitted = len(df) - max_rows
+        df = pd.concat([df.head(head_rows), df.tail(max_rows - head_rows)])
+
+    header = [str(col) for col in df.columns]
+    columns, max_lengths = [], []
+    for i, col in enumerate(header):
+        values, longest = _format_column(df.iloc[:, i], max_len, trunc_len)
+        columns.append(values)
+        max_lengths.append(max(len(col), longest))
+
+    rows = [list(row) for row in zip(*columns)]
+    if omitted:
+        summary = [f"... {omitted:,} more rows ..."] + [''] * (len(header) - 1)
+        rows.insert(head_rows, summary)
+    data = [header] + rows
+    num_cols = len(header)
 
     # Calculate column widths based on content
     available_width = 7.5 * inch
@@ -35,7 +64,6 @@ def convert_df_to_table(data_object, is_snapshot=False):
     avg_char_width = 0.075 * inch
 
     # Compute widths dynamically with constraints
-    max_lengths = [max(len(str(row[i])) for row in data) for i in range(num_cols)]
     col_widths = [min(max(min_width, length * avg_char_width), max_width)
                   for length in max_lengths]
 
@@ -76,21 +104,32 @@ def convert_df_to_table(data_object, is_snapshot=False):
         ('ROWBACKGROUNDS', (0, 1), (-1, -1),
          [colors.white, colors.HexColor('#F5F5F5')])
     ])
+    if omitted:
+        summary_row = head_rows + 1
+        style.add('SPAN', (0, summary_row), (-1, summary_row))
+        style.add('ALIGN', (0, summary_row), (-1, summary_row), 'CENTER')
+        style.add('FONTNAME', (0, summary_row), (-1, summary_row), 'Helvetica-Oblique')
     table.setStyle(style)
     return table
 
 
+def _png_to_image(png_bytes):
+    # Create ReportLab Image with standard dimensions
+    return Image(io.BytesIO(png_bytes), width=5.5*inch, height=3.5*inch)
+
+
 def convert_plot_to_image(plot_fig):
     """Converts a Plotly Figure object into a ReportLab Image object."""
 
-    # Export plot as PNG to in-memory buffer
-    img_buffer = io.BytesIO()
-    plot_fig.write_image(img_buffer, format='png', scale=2)
-    img_buffer.seek(0)
+    # Rendered by the warm, caching render service instead of a cold Kaleido
+    png_bytes = get_render_service().render(plot_fig, format='png', scale=2)
+    return _png_to_image(png_bytes)
 
-    # Create ReportLab Image with standard dimensions
-    img = Image(img_buffer, width=5.5*inch, height=3.5*inch)
-    return img
+
+def convert_plots_to_images(plot_figs):
+    """Converts several Plotly Figures at once, rendering them concurrently."""
+    png_list = get_render_service().render_many(plot_figs, format='png', scale=2)
+    return [_png_to_image(png_bytes) for png_bytes in png_list]
 
 
 def markdown_to_pdf_html(text):
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+from monitoring.tracing import stage
+
+
+# Number of warm Chromium tabs kept open by the service, i.e. how many
+# figures render at the same time.
+RENDER_TABS = int(os.getenv("INSIGHT_RENDER_TABS", 2))
+RENDER_TIMEOUT = 90
+# Byte budget for the rendered PNG cache (default 128 MB).
+MAX_CACHE_BYTES = int(os.getenv("INSIGHT_RENDER_CACHE_BYTES", 128 * 1024**2))
+
+
+class RenderService:
+    """
+    Long-lived figure renderer.
+    Keeps one Kaleido/Chromium instance open on a background event loop so
+    only the first render pays the browser start-up, and caches the image
+    bytes by figure content so unchanged plots are never rendered twice.
+    """
+
+    def __init__(self, tabs=RENDER_TABS, max_cache_bytes=MAX_CACHE_BYTES):
+        self.tabs = tabs
+        self.max_cache_bytes = max_cache_bytes
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._kaleido = None
+
+    def start(self):
+        """Starts the browser if needed. Safe to call from any thread."""
+        with self._lock:
+            if self._kaleido is not None:
+                return
+            import kaleido
+
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="render-service", daemon=True).start()
+            try:
+                browser = kaleido.Kaleido(n=self.tabs, timeout=RENDER_TIMEOUT)
+                asyncio.run_coroutine_threadsafe(browser.__aenter__(), loop).result()
+            except Exception:
+                loop.call_soon_threadsafe(loop.stop)
+                raise
+            self._loop, self._kaleido = loop, browser
+
+    def stop(self):
+        """Closes the browser; the next render starts a new one."""
+        with self._lock:
+            if self._kaleido is None:
+                return
+            future = asyncio.run_coroutine_threadsafe(
+                self._kaleido.__aexit__(None, None, None), self._loop)
+            try:
+                future.result(timeout=RENDER_TIMEOUT)
+            finally:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop, self._kaleido = None, None
+
+    @staticmethod
+    def cache_key(fig, opts):
+        """Hash of the figure JSON plus the render parameters."""
+        payload = fig.to_json() + json.dumps(opts, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def render(self, fig, format="png", scale=2, width=None, height=None):
+        """Renders a single figure and returns the image bytes."""
+        return self.render_many([fig], format=format, scale=scale, width=width, height=height)[0]
+
+    def render_many(self, figs, format="png", scale=2, width=None, height=None):
+        """
+        Renders a batch of figures concurrently across the warm tabs.
+        Returns the image bytes in input order; cached figures are not rendered.
+        """
+        opts = {"format": format, "scale": scale}
+        if width:
+            opts["width"] = width
+        if height:
+            opts["height"] = height
+
+        keys = [self.cache_key(fig, opts) for fig in figs]
+        results = [self._cache_get(key) for key in keys]
+        missing = {}
+        for fig, key, result in zip(figs, keys, results):
+            if result is None and key not in missing:
+                missing[key] = fig
+
+        with stage("render", figures=len(figs), cached=len(figs) - len(missing)) as span:
+            if missing:
+                rendered = self._render_uncached(list(missing.values()), opts)
+                span["png_bytes"] = sum(len(image) for image in rendered)
+                for key, image in zip(missing, rendered):
+                    self._cache_put(key, image)
+                by_key = dict(zip(missing, rendered))
+                results = [by_key.get(key, result) for key, result in zip(keys, results)]
+        return results
+
+    def _render_uncached(self, figs, opts):
+        try:
+            self.start()
+        except Exception:
+            # No warm browser available (e.g. Chromium failed to launch):
+            # fall back to plotly's one-shot export.
+            return [pio.to_image(fig, **opts) for fig in figs]
+
+        async def render_all():
+            return await asyncio.gather(*(self._kaleido.calc_fig(fig, opts=opts) for fig in figs))
+
+        # Kaleido does not give a tab back to its pool when a render times
+        # out, so a stuck batch would block every later render. Bound the wait
+        # and replace the browser on any failure.
+        timeout = RENDER_TIMEOUT * (math.ceil(len(figs) / self.tabs) + 1)
+        future = asyncio.run_coroutine_threadsafe(render_all(), self._loop)
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            future.cancel()
+            try:
+                self.stop()
+            except Exception:
+                pass  # The browser is dropped either way.
+            return [pio.to_image(fig, **opts) for fig in figs]
+
+    def _cache_get(self, key):
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+            return image
+
+    def _cache_put(self, key, image):
+        with self._lock:
+            if key in self._cache or len(image) > self.max_cache_bytes:
+                return
+            self._cache[key] = image
+            self._cache_bytes += len(image)
+            while self._cache_bytes > self.max_cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_render_service():
+    """Returns the process-wide render service, shared by all sessions."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RenderService()
+        return _service